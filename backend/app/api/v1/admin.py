@@ -1,25 +1,52 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-from app.retriever.faiss_index import FaissIndex
+from fastapi import APIRouter, HTTPException
+from app.retriever.faiss_index import FaissIndex, INDEX_TYPES
 from app.core.config import settings
 from app.db.mongo import db
 import datetime
 
 router = APIRouter(prefix="/admin")
 
-from app.retriever.retriever import get_index as _get_index
+from app.retriever.retriever import get_index as _get_index, get_index_manager, get_query_batcher
+from app.retriever.doc_cache import doc_cache
+from app.rag.answer_cache import answer_cache
+from app.core.startup import startup_report
 
 @router.post("/reindex")
-async def trigger_reindex(background_tasks: BackgroundTasks):
+async def trigger_reindex(index_type: str | None = None):
     """
     Trigger a background reindex. This returns immediately and runs rebuild in background.
+    index_type: optional override (auto, flat, ivf_flat, ivf_pq, hnsw, sq8); persisted for later builds.
     """
-    def _reindex_job():
-        idx = _get_index()
-        idx.build_from_db()
-    background_tasks.add_task(_reindex_job)
+    if index_type and index_type != "auto" and index_type not in INDEX_TYPES:
+        raise HTTPException(status_code=400, detail=f"index_type must be one of: auto, {', '.join(INDEX_TYPES)}")
+
+    # builds a new generation on the index writer thread; queries keep using the live one
+    get_index_manager().rebuild(index_type=index_type)
     return {"status": "reindexing started", "started_at": datetime.datetime.utcnow().isoformat()}
 
+@router.post("/index/refresh")
+async def trigger_refresh(detect_deletions: bool = False):
+    """
+    Incrementally index embeddings added since the last build/refresh (runs in background).
+    detect_deletions: also drop vectors whose doc_id is gone from db.embeddings.
+    """
+    get_index_manager().refresh(detect_deletions=detect_deletions)
+    return {"status": "refresh started", "started_at": datetime.datetime.utcnow().isoformat()}
+
 @router.get("/index/status")
 async def index_status():
     idx = _get_index()
-    return {"ntotal": getattr(idx.index, "ntotal", 0), "dim": idx.dim}
+    return {
+        **get_index_manager().status(),
+        "dim": idx.dim,
+        "index_type": idx.index_type,
+        "index_kind": idx.index_kind,
+        "doc_cache": doc_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "query_batcher": get_query_batcher().stats(),
+    }
+
+@router.get("/startup")
+async def startup_status():
+    """Cold-start profile: app.main import time, startup phases, lazily imported modules."""
+    return startup_report()
@@ -0,0 +1,72 @@
+# backend/app/api/v1/ingest.py
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from app.core.config import settings
+from app.db.mongo import db
+from app.ingest.jobs import get_ingest_jobs, get_job, IngestQueueFull
+
+router = APIRouter(prefix="/v1")
+
+class IngestText(BaseModel):
+    text: str
+    title: str | None = None
+    # optional source url stored with the chunks (defaults to a content-derived "text:..." id)
+    url: str | None = None
+    # stored on every chunk; queries filter on them with {"concept": ...} / {"tags": ...}
+    tags: list[str] = []
+
+class IngestRequest(BaseModel):
+    urls: list[str] = []
+    documents: list[IngestText] = []
+    source: str = "api"
+    # tags for every url and document in the job (merged with each document's own)
+    tags: list[str] = []
+
+def _job_out(job: dict) -> dict:
+    return {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "source": job.get("source"),
+        "progress": job.get("progress"),
+        "result": job.get("result"),
+        "errors": job.get("errors", []),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+@router.post("/ingest", status_code=202)
+async def create_ingest_job(req: IngestRequest):
+    """
+    Queue URLs and/or raw text for ingestion and return the job id right away.
+    Fetching, chunking and embedding run on the background ingest pool; poll GET /v1/ingest/{job_id}.
+    """
+    items = [{"url": u} for u in req.urls] + [d.model_dump(exclude_none=True) for d in req.documents if d.text.strip()]
+    for item in items:
+        tags = list(dict.fromkeys(req.tags + item.get("tags", [])))
+        if tags:
+            item["tags"] = tags
+        else:
+            item.pop("tags", None)
+    if not items:
+        raise HTTPException(status_code=400, detail="Provide at least one url or non-empty document.")
+    if len(items) > settings.INGEST_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.INGEST_MAX_ITEMS} urls/documents per job.")
+    try:
+        job = get_ingest_jobs().submit(items, source=req.source)
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return {"job_id": str(job["_id"]), "status": job["status"], "items": len(items)}
+
+@router.get("/ingest/{job_id}")
+async def ingest_job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found.")
+    return _job_out(job)
+
+@router.get("/ingest")
+async def list_ingest_jobs(limit: int = 20, status: str | None = None):
+    query = {"status": status} if status else {}
+    jobs = db.ingest_jobs.find(query, {"items": 0}).sort("created_at", -1).limit(min(max(limit, 1), 100))
+    return {"jobs": [_job_out(j) for j in jobs], "queue": get_ingest_jobs().stats()}
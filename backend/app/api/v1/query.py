@@ -0,0 +1,71 @@
+# backend/app/api/v1/query.py
+import asyncio
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from app.core.config import settings
+from app.core.startup import require_ready
+from app.rag.rag_engine import answer_query
+from app.rag.answer_cache import answer_cache
+from app.retriever.retriever import top_k_documents_batch
+
+router = APIRouter(prefix="/v1")
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str] = Field(max_length=settings.QUERY_BATCH_MAX_SIZE)
+    k: int = Field(5, ge=1, le=settings.QUERY_MAX_K)
+    # optional metadata filter: {"source": ..., "url": ..., "concept"/"tags": ...}
+    filters: dict | None = None
+    # set to False to only run retrieval (e.g. retrieval evaluation jobs)
+    generate: bool = True
+
+class BatchQueryItem(BaseModel):
+    query: str
+    answer: str | None = None
+    sources: list[str]
+    cache: dict | None = None
+    error: str | None = None
+
+class BatchQueryResponse(BaseModel):
+    results: list[BatchQueryItem]
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(req: BatchQueryRequest):
+    """
+    Answer many queries in one call: one embed_texts call, one FAISS matrix search,
+    one Mongo hydration query, then LLM generation fanned out with bounded concurrency.
+    """
+    if not req.queries:
+        return BatchQueryResponse(results=[])
+    await require_ready()
+
+    try:
+        # the query vectors come back with the hits, for the answer cache lookups below
+        docs_per_query, normed = await asyncio.to_thread(
+            top_k_documents_batch, req.queries, req.k, req.filters, True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    sem = asyncio.Semaphore(max(1, settings.QUERY_BATCH_CONCURRENCY))
+
+    async def _answer(i: int, query: str, docs: list) -> BatchQueryItem:
+        sources = [d["doc"]["url"] for d in docs]
+        if not req.generate:
+            return BatchQueryItem(query=query, sources=sources)
+        if not docs:
+            return BatchQueryItem(query=query, sources=[], error="No relevant documents found.")
+        doc_ids = [str(d["doc"]["_id"]) for d in docs]
+        cached = answer_cache.lookup(normed[i], doc_ids)
+        if cached:
+            return BatchQueryItem(query=query, answer=cached["answer"], sources=sources,
+                                  cache={"hit": True, "similarity": cached["similarity"], "cached_query": cached["query"]})
+        async with sem:
+            try:
+                answer = await asyncio.to_thread(answer_query, query, docs)
+            except Exception as e:
+                print("[query_batch] LLM generation failed:", e)
+                return BatchQueryItem(query=query, sources=sources, error="Failed to generate answer.")
+        answer_cache.add(query, normed[i], answer, doc_ids, sources)
+        return BatchQueryItem(query=query, answer=answer, sources=sources)
+
+    results = await asyncio.gather(*[_answer(i, q, d) for i, (q, d) in enumerate(zip(req.queries, docs_per_query))])
+    return BatchQueryResponse(results=list(results))
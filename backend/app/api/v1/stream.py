@@ -3,7 +3,9 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import AsyncGenerator
 import asyncio
 from app.rag.rag_engine import answer_query
-from app.retriever.retriever import top_k_documents
+from app.retriever.retriever import atop_k_documents
+from app.core.config import settings
+from app.core.startup import wait_ready
 
 router = APIRouter(prefix="/v1")
 
@@ -34,7 +36,11 @@ async def websocket_chat(ws: WebSocket):
         user_query = data.get("query")
         user_id = data.get("user_id", "anonymous")
 
-        docs = top_k_documents(user_query, k=5)
+        if not await wait_ready(settings.WARMUP_QUERY_WAIT_SECONDS):
+            await ws.send_json({"type":"error","message":"Service is warming up, please retry shortly."})
+            await ws.close()
+            return
+        docs = await atop_k_documents(user_query, k=5)
         if not docs:
             await ws.send_json({"type":"error","message":"No knowledge found for this query."})
             await ws.close()
@@ -20,7 +20,113 @@ class Settings(BaseSettings):
     # --- VECTOR / EMBEDDINGS ---
     EMBEDDING_MODEL: str
     EMBEDDING_DIM: int
+    # torch | onnx (ONNX Runtime fp32) | onnx_int8 (dynamic int8); ONNX exports are cached in EMBEDDING_ONNX_DIR
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_DIR: str = "onnx_models"
+    # optimum quantization preset for onnx_int8: arm64, avx2, avx512 or avx512_vnni
+    EMBEDDING_ONNX_QUANTIZATION: str = "avx2"
     FAISS_INDEX_PATH: str
+    # db.embeddings vector layout for new rows: float32 | float16 (packed BSON Binary) | list (legacy arrays)
+    EMBEDDING_STORAGE: str = "float32"
+
+    # --- FAISS INDEX TYPE ---
+    # one of: auto, flat, ivf_flat, ivf_pq, hnsw, sq8 ("auto" picks from corpus size + recall target)
+    FAISS_INDEX_TYPE: str = "auto"
+    FAISS_RECALL_TARGET: float = 0.95
+    FAISS_TRAIN_SAMPLE: int = 20000
+    # default per-query search knobs (can be overridden per call)
+    FAISS_NPROBE: int = 16
+    FAISS_EF_SEARCH: int = 64
+    # quantized types (sq8): search top_k * factor int8 codes, re-rank them with the mmapped
+    # full-precision .vecs file; 1 = codes only
+    FAISS_RERANK_FACTOR: int = 4
+    # delta segment (append-only log) is folded into the main index past either threshold
+    FAISS_DELTA_MAX_VECTORS: int = 2000
+    FAISS_COMPACT_INTERVAL_SECONDS: int = 900
+    # memory-map the main index and doc-id map on load (read-only; adds go to the delta segment)
+    FAISS_MMAP: bool = True
+    # build the filter postings (one knowledge_documents scan) in the load/rebuild job instead of
+    # on the first filtered query
+    FAISS_PREBUILD_POSTINGS: bool = True
+    # upload the index to GridFS (bucket faiss_snapshots) after rebuilds and every
+    # FAISS_SNAPSHOT_INTERVAL_MINUTES when it changed (one process uploads); restored when local files are missing
+    FAISS_SNAPSHOT_GRIDFS: bool = True
+    FAISS_SNAPSHOT_KEEP: int = 2
+    FAISS_SNAPSHOT_INTERVAL_MINUTES: int = 60
+    # incremental refresh from db.embeddings (created_at/_id watermark); 0 disables the interval job
+    INDEX_REFRESH_MINUTES: int = 5
+    INDEX_REFRESH_BATCH: int = 1000
+    # re-scan rows stamped this far before the watermark: created_at is set by the writer, so a
+    # slow insert can commit after a refresh already moved past it (already indexed rows are skipped)
+    INDEX_REFRESH_OVERLAP_SECONDS: int = 600
+    # weekly full rebuild (re-picks the "auto" index type, retrains IVF, clears tombstones);
+    # cron day_of_week, e.g. "sun"; empty disables
+    INDEX_REBUILD_DAY: str = "sun"
+    # cursor batch size for full rebuilds (rows decoded + normalized per vectorized step)
+    FAISS_BUILD_BATCH: int = 4096
+
+    # --- RETRIEVAL CACHES ---
+    # hydrated knowledge_documents chunks (LRU + TTL)
+    DOC_CACHE_MAX_ENTRIES: int = 2000
+    DOC_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    DOC_CACHE_TTL_SECONDS: int = 3600
+    # query text -> embedding cache; set QUERY_EMBED_CACHE_PATH (.npz) to persist across restarts
+    QUERY_EMBED_CACHE_SIZE: int = 5000
+    QUERY_EMBED_CACHE_PATH: str = ""
+    # semantic answer cache for /v1/query (past answers reused above this cosine similarity)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_TTL_SECONDS: int = 24 * 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 5000
+
+    # --- BATCH QUERIES ---
+    QUERY_BATCH_MAX_SIZE: int = 1000
+    # largest k a batch request may ask for
+    QUERY_MAX_K: int = 50
+    # max concurrent LLM calls per /v1/query/batch request
+    QUERY_BATCH_CONCURRENCY: int = 4
+    # micro-batching of concurrent single-query retrievals (one embed + search per window)
+    QUERY_MICROBATCH_ENABLED: bool = True
+    QUERY_MICROBATCH_MAX_WAIT_MS: float = 3.0
+    QUERY_MICROBATCH_MAX_ITEMS: int = 64
+
+    # --- INGEST ---
+    # chunks per embed call in ingest_documents (bounds model memory for large batches)
+    INGEST_EMBED_BATCH: int = 256
+    # background ingest jobs (POST /v1/ingest): worker threads, queued jobs per process, items per job
+    INGEST_WORKERS: int = 2
+    INGEST_MAX_PENDING: int = 50
+    INGEST_MAX_ITEMS: int = 50
+    # a running job with no progress for this long (e.g. its process died) is re-queued at startup
+    INGEST_JOB_STALE_SECONDS: int = 600
+
+    # --- SCRAPER (app/scraper/async_fetcher.py) ---
+    # requests in flight per host, and minimum seconds between request starts to one host
+    SCRAPER_PER_HOST_CONCURRENCY: int = 2
+    SCRAPER_POLITENESS_DELAY: float = 1.0
+    SCRAPER_MAX_CONNECTIONS: int = 20
+    SCRAPER_TIMEOUT: float = 20.0
+    SCRAPER_RETRIES: int = 3
+    # ETag/Last-Modified page cache for conditional GETs; empty disables
+    SCRAPER_CACHE_DIR: str = "scraper_cache"
+    SCRAPER_USER_AGENT: str = "AdaptiveTutorBot/1.0 (+email@example.com)"
+
+    # --- STARTUP / WARMUP ---
+    # queries that arrive while the background warmup runs wait this long, then get a 503
+    WARMUP_QUERY_WAIT_SECONDS: float = 20.0
+    # prefill the doc cache with chunks retrieved by this many recent chats; 0 disables
+    WARMUP_DOC_PREFILL_CHATS: int = 200
+
+    # --- SIDECAR ---
+    # Unix socket of a shared model+index process (python -m app.sidecar.server); empty = in-process
+    SIDECAR_SOCKET: str = ""
+    # shared secret for the sidecar socket (it speaks pickle); empty = the sidecar generates one
+    # into SIDECAR_SOCKET + ".key" (mode 0600) and workers running as the same user read it
+    SIDECAR_AUTHKEY: str = ""
+    # math threads for the sidecar (torch / FAISS / BLAS); 0 = all cores
+    SIDECAR_THREADS: int = 0
+    # embed/search in-process while the sidecar is unreachable
+    SIDECAR_FALLBACK_LOCAL: bool = True
 
     # --- DATABASE ---
     MONGO_URI: str
@@ -0,0 +1,134 @@
+# backend/app/core/startup.py
+"""
+Cold-start helpers.
+- lazy_import(): module proxy that imports heavy libraries (faiss, sentence_transformers)
+  on first attribute access instead of when app.main is imported
+- phase(): times a named startup step
+- begin_warmup()/end_warmup()/require_ready(): readiness of the background warmup; queries
+  that arrive before it finishes wait up to WARMUP_QUERY_WAIT_SECONDS, then get a 503
+- startup_report(): import time of app.main, startup phases, lazy imports and which heavy
+  modules are loaded; served at /admin/startup and /readyz, printed once warmup finishes
+For a per-module import breakdown run scripts/profile_startup.py.
+"""
+import asyncio
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# modules that should NOT be imported just by importing app.main
+HEAVY_MODULES = ("torch", "sentence_transformers", "faiss", "apscheduler", "bs4", "onnxruntime")
+
+_T0 = time.perf_counter()
+_report = {"import_ms": None, "phases": [], "lazy_imports": []}
+_current_phase = None
+# not_started (no warmup in this process, e.g. scripts) | running | ready | degraded (a phase failed)
+_warmup = {"state": "not_started", "started_at": None, "ms": None}
+_ready = threading.Event()
+_ready.set()
+
+class LazyModule:
+    """Stand-in for a module; the real import happens on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    already = self._name in sys.modules
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if not already:
+                        _report["lazy_imports"].append({
+                            "module": self._name,
+                            "ms": round((time.perf_counter() - started) * 1000, 1),
+                            "during": _current_phase or "first use",
+                        })
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+def mark_imported():
+    """Call at the end of app.main's module body."""
+    _report["import_ms"] = round((time.perf_counter() - _T0) * 1000, 1)
+
+@contextmanager
+def phase(name: str):
+    """Time one startup step; failures are recorded and re-raised."""
+    global _current_phase
+    previous, _current_phase = _current_phase, name
+    entry = {"phase": name, "status": "running", "ms": None, "ok": None}
+    _report["phases"].append(entry)
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        _current_phase = previous
+        entry.update(ms=round((time.perf_counter() - started) * 1000, 1), ok=ok, status="done" if ok else "failed")
+
+def begin_warmup():
+    _ready.clear()
+    _warmup.update(state="running", started_at=time.perf_counter(), ms=None)
+
+def end_warmup():
+    failed = any(p["ok"] is False for p in _report["phases"])
+    _warmup.update(state="degraded" if failed else "ready",
+                   ms=round((time.perf_counter() - _warmup["started_at"]) * 1000, 1))
+    _ready.set()
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+async def wait_ready(timeout: float) -> bool:
+    """Wait (without blocking the event loop) until warmup has finished; False on timeout."""
+    deadline = time.perf_counter() + timeout
+    while not _ready.is_set():
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(0.05, remaining))
+    return True
+
+async def require_ready():
+    """Gate for query endpoints: wait for warmup, then fall back to 503 + Retry-After."""
+    from fastapi import HTTPException
+    from .config import settings
+    if not await wait_ready(settings.WARMUP_QUERY_WAIT_SECONDS):
+        raise HTTPException(status_code=503, detail="Service is warming up, please retry shortly.",
+                            headers={"Retry-After": "5"})
+
+def startup_report() -> dict:
+    return {
+        "ready": is_ready(),
+        "warmup": _warmup["state"],
+        "warmup_ms": _warmup["ms"],
+        "import_ms": _report["import_ms"],
+        "phases": [dict(p) for p in _report["phases"]],
+        "lazy_imports": list(_report["lazy_imports"]),
+        "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+        "uptime_s": round(time.perf_counter() - _T0, 1),
+    }
+
+def print_startup_report():
+    r = startup_report()
+    phases = ", ".join(f"{p['phase']}={p['ms'] or 0:.0f}ms{'' if p['ok'] else ' (' + p['status'] + ')'}" for p in r["phases"])
+    print(f"[startup] app.main imported in {r['import_ms']}ms; warmup {r['warmup']} in {r['warmup_ms']}ms; "
+          f"phases: {phases or 'none'}")
+    for item in r["lazy_imports"]:
+        print(f"[startup]   lazy import {item['module']}: {item['ms']:.0f}ms (during {item['during']})")
@@ -2,10 +2,25 @@ from pymongo import MongoClient
 from .schemas import *
 from ..core.config import settings
 
+# MongoClient connects lazily, so creating it here costs no round trip
 client = MongoClient(settings.MONGO_URI)
 db = client[settings.MONGO_DB]
 
-# ensure indexes
-db.knowledge_documents.create_index([("title","text"),("text","text")], name="text_idx")
-db.chats.create_index([("user_id",1)])
-db.question_bank.create_index([("concept",1),("difficulty",1)])
+_indexes_ensured = False
+
+def ensure_indexes():
+    """Create the collection indexes once per process (called from app startup, not on import)."""
+    global _indexes_ensured
+    if _indexes_ensured:
+        return
+    db.knowledge_documents.create_index([("title","text"),("text","text")], name="text_idx")
+    db.chats.create_index([("user_id",1)])
+    db.embeddings.create_index([("created_at",1),("_id",1)])
+    # content-hash dedup at ingest (see ingest/ingester.py)
+    db.knowledge_documents.create_index([("url",1),("content_hash",1)])
+    db.embeddings.create_index([("content_hash",1)])
+    db.ingest_jobs.create_index([("status",1),("created_at",1)])
+    # single-flight jobs: one queued/running job per key
+    db.ingest_jobs.create_index([("active_key",1)], unique=True, sparse=True)
+    db.question_bank.create_index([("concept",1),("difficulty",1)])
+    _indexes_ensured = True
@@ -1,24 +1,210 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import atexit
+import os
+import re
+import threading
+from collections import OrderedDict
 from ..core.config import settings
+from ..core.startup import lazy_import
+from ..sidecar.client import sidecar_enabled, call_or_fallback
+
+# torch + transformers: imported on the first get_model(), not with this module
+sentence_transformers = lazy_import("sentence_transformers")
 
 _model = None
+_model_lock = threading.Lock()
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+def _onnx_dir() -> str:
+    # exported models are cached per model name, e.g. onnx_models/sentence-transformers__all-MiniLM-L6-v2
+    return os.path.join(settings.EMBEDDING_ONNX_DIR, settings.EMBEDDING_MODEL.replace("/", "__"))
+
+def export_onnx_model(quantized: bool = False) -> str:
+    """
+    Export EMBEDDING_MODEL to ONNX (and optionally a dynamic int8 quantized copy) once,
+    caching it under EMBEDDING_ONNX_DIR. Returns the model file path relative to the cache dir.
+    Needs `optimum[onnxruntime]`.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    local_dir = _onnx_dir()
+
+    def _existing(*names):
+        for name in names:
+            if os.path.exists(os.path.join(local_dir, name)):
+                return name
+        return None
+
+    fp32_file = _existing(os.path.join("onnx", "model.onnx"), "model.onnx")
+    if fp32_file is None:
+        print(f"[embedder] exporting {settings.EMBEDDING_MODEL} to ONNX in {local_dir}")
+        # backend="onnx" converts the checkpoint when the hub repo has no ONNX file
+        sentence_transformers.SentenceTransformer(settings.EMBEDDING_MODEL, backend="onnx").save_pretrained(local_dir)
+        fp32_file = _existing(os.path.join("onnx", "model.onnx"), "model.onnx")
+        if fp32_file is None:
+            raise RuntimeError(f"ONNX export did not produce a model file in {local_dir}")
+    if not quantized:
+        return fp32_file
+
+    config = settings.EMBEDDING_ONNX_QUANTIZATION
+    int8_file = os.path.join("onnx", f"model_qint8_{config}.onnx")
+    if not os.path.exists(os.path.join(local_dir, int8_file)):
+        print(f"[embedder] quantizing ONNX model to int8 ({config})")
+        fp32 = sentence_transformers.SentenceTransformer(local_dir, backend="onnx", model_kwargs={"file_name": fp32_file})
+        export_dynamic_quantized_onnx_model(fp32, quantization_config=config, model_name_or_path=local_dir,
+                                            file_suffix=f"qint8_{config}")
+    return int8_file
+
+def load_model(backend: str = None):
+    """
+    Load EMBEDDING_MODEL on the given backend (default EMBEDDING_BACKEND):
+    torch, onnx (ONNX Runtime fp32) or onnx_int8 (dynamic int8 quantized).
+    Raises if a requested ONNX backend can't be loaded: silently serving torch vectors
+    would mix them with vectors stored under the ONNX model_tag().
+    """
+    backend = (backend or settings.EMBEDDING_BACKEND).lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND must be one of {', '.join(EMBEDDING_BACKENDS)} (got {backend!r})")
+    if backend == "torch":
+        return sentence_transformers.SentenceTransformer(settings.EMBEDDING_MODEL)
+    try:
+        file_name = export_onnx_model(quantized=backend == "onnx_int8")
+        model = sentence_transformers.SentenceTransformer(_onnx_dir(), backend="onnx", model_kwargs={"file_name": file_name})
+        print(f"[embedder] using {backend} embedding backend ({file_name})")
+        return model
+    except Exception as e:
+        print(f"[embedder] error: {backend} embedding backend failed to load: {e}")
+        raise RuntimeError(f"EMBEDDING_BACKEND={backend} could not be loaded ({e}). Install "
+                           "optimum[onnxruntime] or set EMBEDDING_BACKEND=torch.") from e
 
 def get_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        # warmup and an early query may both get here; load the model once
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
     return _model
 
-def embed_texts(texts:list):
-    """
-    texts: list[str]
-    returns: np.ndarray of shape (len(texts), dim)
-    """
-    model = get_model()
+def model_tag() -> str:
+    # quantized backends give slightly different vectors; don't mix them in the persisted
+    # query cache or reuse them across backends at ingest (content_hash)
+    backend = settings.EMBEDDING_BACKEND.lower()
+    return settings.EMBEDDING_MODEL if backend == "torch" else f"{settings.EMBEDDING_MODEL}@{backend}"
+
+# query-side cache: normalized query text -> (normed float32 vector, norm)
+_query_cache = OrderedDict()
+_query_cache_lock = threading.Lock()
+_query_cache_loaded = False
+_query_cache_dirty = False
+query_cache_stats = {"hits": 0, "misses": 0}
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "")).strip().lower()
+
+def _load_query_cache():
+    """Read the optional on-disk cache once (ignored if it was built with another model)."""
+    global _query_cache_loaded
+    _query_cache_loaded = True
+    path = settings.QUERY_EMBED_CACHE_PATH
+    if not path or not os.path.exists(path):
+        return
+    try:
+        data = np.load(path, allow_pickle=False)
+        if str(data["model"]) != model_tag():
+            return
+        for key, vec, norm in zip(data["keys"], data["normed"], data["norms"]):
+            _query_cache[str(key)] = (vec.astype("float32"), float(norm))
+        while len(_query_cache) > settings.QUERY_EMBED_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+        print(f"[embedder] loaded {len(_query_cache)} cached query embeddings from {path}")
+    except Exception as e:
+        print("[embedder] warning: failed to load query cache:", e)
+
+def save_query_cache():
+    """Persist the query cache to QUERY_EMBED_CACHE_PATH (no-op when unset or unchanged)."""
+    global _query_cache_dirty
+    path = settings.QUERY_EMBED_CACHE_PATH
+    if not path or not _query_cache_dirty:
+        return
+    with _query_cache_lock:
+        keys = list(_query_cache.keys())
+        if not keys:
+            return
+        normed = np.vstack([v[0] for v in _query_cache.values()]).astype("float32")
+        norms = np.array([v[1] for v in _query_cache.values()], dtype="float32")
+        _query_cache_dirty = False
+    try:
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, keys=np.array(keys, dtype=str), normed=normed, norms=norms,
+                 model=np.array(model_tag()))
+        os.replace(tmp, path)
+    except Exception as e:
+        print("[embedder] warning: failed to save query cache:", e)
+
+atexit.register(save_query_cache)
+
+def _encode(texts: list, model=None):
+    model = model or get_model()
     embs = model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
     # optional L2-norm for cosine similarity
     norms = np.linalg.norm(embs, axis=1, keepdims=True)
     norms[norms==0] = 1.0
     normed = embs / norms
     return embs.astype("float32"), normed.astype("float32")
+
+def _embed_cached(texts: list):
+    global _query_cache_dirty
+    keys = [normalize_query(t) for t in texts]
+    results = [None] * len(keys)
+    with _query_cache_lock:
+        if not _query_cache_loaded:
+            _load_query_cache()
+        for i, key in enumerate(keys):
+            hit = _query_cache.get(key)
+            if hit is not None:
+                _query_cache.move_to_end(key)
+                results[i] = hit
+                query_cache_stats["hits"] += 1
+            else:
+                query_cache_stats["misses"] += 1
+
+    # the normalized form is only the cache key; the model sees the text as written
+    # (casing can change the vector), first spelling wins for duplicate keys
+    missing = {}
+    for i, r in enumerate(results):
+        if r is None:
+            missing.setdefault(keys[i], texts[i])
+    if missing:
+        embs, normed = _encode(list(missing.values()))
+        fresh = {}
+        for key, emb, vec in zip(missing, embs, normed):
+            fresh[key] = (vec, float(np.linalg.norm(emb)))
+        with _query_cache_lock:
+            for key, entry in fresh.items():
+                _query_cache[key] = entry
+            while len(_query_cache) > settings.QUERY_EMBED_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+            _query_cache_dirty = True
+        results = [r if r is not None else fresh[keys[i]] for i, r in enumerate(results)]
+
+    normed = np.vstack([r[0] for r in results]).astype("float32")
+    embs = normed * np.array([r[1] for r in results], dtype="float32")[:, None]
+    return embs.astype("float32"), normed
+
+def embed_texts(texts:list, use_cache: bool = False):
+    """
+    texts: list[str]
+    use_cache: serve repeat queries from the query embedding cache (query-side only;
+               ingest-time batch encoding should leave this off)
+    returns: np.ndarray of shape (len(texts), dim)
+    With SIDECAR_SOCKET set, the shared sidecar process does the encoding.
+    """
+    if sidecar_enabled():
+        return call_or_fallback("embed", _embed_local, list(texts), use_cache=use_cache)
+    return _embed_local(texts, use_cache=use_cache)
+
+def _embed_local(texts: list, use_cache: bool = False):
+    if use_cache and settings.QUERY_EMBED_CACHE_SIZE > 0:
+        return _embed_cached(list(texts))
+    return _encode(texts)
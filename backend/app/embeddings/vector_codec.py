@@ -0,0 +1,106 @@
+# backend/app/embeddings/vector_codec.py
+"""
+Packed vector format for db.embeddings.
+
+A row stores ONE L2-normalized copy of the vector as BSON Binary plus its original norm:
+    vec: Binary(little-endian float32 or float16 bytes), vec_dtype: "f4" | "f2", norm: float
+The raw embedding is normed * norm, so it no longer needs its own array.
+Legacy rows (embedding / normed_embedding as arrays of doubles) are still decoded.
+"""
+import numpy as np
+from bson.binary import Binary
+from ..core.config import settings
+
+VEC_DTYPES = {"float32": "f4", "float16": "f2"}
+_NP_DTYPES = {"f4": np.dtype("<f4"), "f2": np.dtype("<f2")}
+
+# fields a reader needs to rebuild vectors from either layout
+VECTOR_FIELDS = {"vec": 1, "vec_dtype": 1, "normed_embedding": 1, "embedding": 1}
+
+def storage_dtype() -> str:
+    """vec_dtype code for new rows, or None when EMBEDDING_STORAGE=list (legacy arrays)."""
+    storage = settings.EMBEDDING_STORAGE.lower()
+    if storage == "list":
+        return None
+    if storage not in VEC_DTYPES:
+        raise ValueError(f"EMBEDDING_STORAGE must be one of list, float32, float16 (got {storage!r})")
+    return VEC_DTYPES[storage]
+
+def encode_vector(normed, norm: float, vec_dtype: str = None) -> dict:
+    """Fields to $set on an embeddings row for one normalized vector and its norm."""
+    vec_dtype = vec_dtype or storage_dtype()
+    if vec_dtype is None:
+        normed = np.asarray(normed, dtype="float32")
+        return {
+            "embedding": (normed * norm).tolist(),
+            "normed_embedding": normed.tolist(),
+        }
+    arr = np.ascontiguousarray(normed, dtype=_NP_DTYPES[vec_dtype])
+    return {"vec": Binary(arr.tobytes()), "vec_dtype": vec_dtype, "norm": float(norm)}
+
+def encode_vectors(embs, normed) -> list:
+    """encode_vector for a batch: raw embeddings + their normalized copies -> list of field dicts."""
+    embs = np.asarray(embs, dtype="float32")
+    norms = np.linalg.norm(embs, axis=1) if len(embs) else np.zeros(0, dtype="float32")
+    vec_dtype = storage_dtype()
+    return [encode_vector(normed[i], norms[i], vec_dtype) for i in range(len(norms))]
+
+def decode_vector(row: dict):
+    """
+    The normalized vector of one row (float32 rows are a zero-copy read-only view
+    over the BSON bytes), or None if the row has no usable vector.
+    """
+    vec = row.get("vec")
+    if vec is not None:
+        arr = np.frombuffer(vec, dtype=_NP_DTYPES[row.get("vec_dtype", "f4")])
+        return arr if arr.dtype == np.float32 else arr.astype("float32")
+    vec = row.get("normed_embedding") or row.get("embedding")
+    if vec is None:
+        return None
+    return np.asarray(vec, dtype="float32").reshape(-1)
+
+def decode_rows(rows, dim: int):
+    """
+    Decode a batch of embeddings rows into one (n, dim) float32 matrix, in row order.
+    Packed rows of the same dtype are decoded with a single np.frombuffer over their
+    concatenated bytes; legacy array rows with a single np.asarray.
+    Returns (matrix, indices of the rows that were kept). Vectors are NOT re-normalized here.
+    """
+    keep, packed, legacy = [], {}, []
+    for i, e in enumerate(rows):
+        vec = e.get("vec")
+        if vec is not None:
+            vec_dtype = e.get("vec_dtype", "f4")
+            if vec_dtype in _NP_DTYPES and len(vec) == dim * _NP_DTYPES[vec_dtype].itemsize:
+                packed.setdefault(vec_dtype, []).append((len(keep), vec))
+                keep.append(i)
+            continue
+        vec = e.get("normed_embedding") or e.get("embedding")
+        if vec is not None and len(vec) == dim:
+            legacy.append((len(keep), vec))
+            keep.append(i)
+
+    if not keep:
+        return np.zeros((0, dim), dtype="float32"), []
+    mat = np.empty((len(keep), dim), dtype="float32")
+    for vec_dtype, items in packed.items():
+        pos = [p for p, _ in items]
+        mat[pos] = np.frombuffer(b"".join(v for _, v in items), dtype=_NP_DTYPES[vec_dtype]).reshape(-1, dim)
+
+    if legacy:
+        pos = [p for p, _ in legacy]
+        try:
+            mat[pos] = np.asarray([v for _, v in legacy], dtype="float32")
+        except (TypeError, ValueError) as ex:
+            print("[vector_codec] batch parse failed, falling back to per-row:", ex)
+            bad = set()
+            for p, vec in legacy:
+                try:
+                    mat[p] = np.asarray(vec, dtype="float32").reshape(dim)
+                except (TypeError, ValueError):
+                    print("[vector_codec] skipped embedding due to parse error")
+                    bad.add(p)
+            if bad:
+                good = [p for p in range(len(keep)) if p not in bad]
+                mat, keep = mat[good], [keep[p] for p in good]
+    return mat, keep
@@ -1,60 +1,192 @@
 # backend/app/ingest/ingester.py
 from ..db.mongo import db
-from ..embeddings.embedder import embed_texts
+from ..embeddings.embedder import embed_texts, model_tag
+from ..embeddings.vector_codec import VECTOR_FIELDS, encode_vectors, decode_vector
 from ..ingest.chunker import basic_chunk_text
 from ..core.config import settings
 import datetime
+import hashlib
+import re
+import time
+import unicodedata
 import numpy as np
-from ..retriever.faiss_index import FaissIndex
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from ..retriever.faiss_index import notify_corpus_changed
+from ..retriever.retriever import get_index_manager
+from ..retriever.doc_cache import doc_cache
 
-def ingest_document(url: str, title: str, raw_text: str, source: str = "manual"):
+def content_hash(text: str) -> str:
+    """Dedup key of a chunk: sha256 of its whitespace-normalized text + the embedding model tag."""
+    norm = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+    return hashlib.sha256(f"{model_tag()}\n{norm}".encode("utf-8")).hexdigest()
+
+def _insert_many(collection, rows: list) -> set:
+    """insert_many(ordered=False); returns the positions of rows that failed."""
+    if not rows:
+        return set()
+    try:
+        collection.insert_many(rows, ordered=False)
+        return set()
+    except BulkWriteError as e:
+        failed = {err["index"] for err in e.details.get("writeErrors", [])}
+        print(f"[ingest] warning: {len(failed)} of {len(rows)} rows failed to insert into {collection.name}")
+        return failed
+
+def _stored_vector(row: dict):
+    """Vector fields to copy from a stored embeddings row, and its normalized vector."""
+    fields = {k: row[k] for k in ("vec", "vec_dtype", "norm", "embedding", "normed_embedding") if k in row}
+    vec = decode_vector(row)
+    return fields, (vec / (np.linalg.norm(vec) or 1.0)).astype("float32")
+
+def ingest_documents(documents: list, chunk_size: int = 1000, overlap: int = 200, add_to_index: bool = True) -> dict:
     """
-    Ingest a single document's text: chunk, embed, store docs+embeddings and add to FAISS.
-    Returns list of inserted doc_id strings.
+    Bulk ingest: chunk every document, dedup chunks by content hash, embed the new text in
+    INGEST_EMBED_BATCH-sized calls, write with insert_many(ordered=False) and add all
+    vectors to FAISS in one commit.
+    documents: [{"url", "title", "raw_text", "source" (default "manual"), "tags" (filterable,
+                 e.g. concepts), "fields": {extra doc fields}}]
+    add_to_index: False for offline scripts (the server picks the rows up on its next refresh)
+    Chunks a url already holds are skipped; text stored under another url reuses its vector.
+    Returns {"doc_ids": {url: ids of all its chunks}, "new_ids": {url: inserted ids},
+             "chunks", "inserted", "embedded", "reused_vectors", "skipped", "failed", "timings_ms"}.
+    skipped = chunks already stored for their url or repeated within the batch.
     """
-    chunks = basic_chunk_text(raw_text)
-    if not chunks:
-        return []
+    timings = {}
+    clock = [time.perf_counter()]
 
-    embs, normed = embed_texts(chunks)
+    def lap(stage):
+        now = time.perf_counter()
+        timings[stage] = round((now - clock[0]) * 1000, 1)
+        clock[0] = now
 
-    # Load single FaissIndex instance in this process for incremental adds
-    faiss_idx = FaissIndex(settings.EMBEDDING_DIM)
-    try:
-        faiss_idx.load()
-    except Exception:
-        # load may fail if index files don't exist; add_single will create internally if needed
-        pass
-
-    inserted_ids = []
-    for i, chunk in enumerate(chunks):
-        doc = {
-            "source": source,
-            "url": url,
-            "title": title,
+    # 1. chunk + hash: (document position, chunk, content_hash)
+    pending = []
+    for i, d in enumerate(documents):
+        for chunk in basic_chunk_text(d.get("raw_text") or "", max_chars=chunk_size, overlap=overlap):
+            if chunk:
+                pending.append((i, chunk, content_hash(chunk)))
+    lap("chunk")
+
+    # 2. dedup against chunks each url already holds and within the batch
+    held = {}
+    if pending:
+        urls = list({d["url"] for d in documents})
+        hashes = list({h for _, _, h in pending})
+        for row in db.knowledge_documents.find({"url": {"$in": urls}, "content_hash": {"$in": hashes}},
+                                               {"url": 1, "content_hash": 1}):
+            held.setdefault((row["url"], row["content_hash"]), str(row["_id"]))
+    new, seen = [], set(held)
+    for i, chunk, h in pending:
+        key = (documents[i]["url"], h)
+        if key not in seen:
+            seen.add(key)
+            new.append((i, chunk, h))
+
+    # vectors already stored for the same text (e.g. under another url)
+    vectors = {}
+    if new:
+        for row in db.embeddings.find({"content_hash": {"$in": list({h for _, _, h in new})}},
+                                      {**VECTOR_FIELDS, "norm": 1, "content_hash": 1}):
+            if row["content_hash"] not in vectors:
+                vectors[row["content_hash"]] = _stored_vector(row)
+    reused = sum(1 for _, _, h in new if h in vectors)
+    lap("dedup")
+
+    # 3. embed each distinct new text once, in large batches
+    fresh = {}
+    for _, chunk, h in new:
+        if h not in vectors:
+            fresh.setdefault(h, chunk)
+    fresh_hashes, fresh_texts = list(fresh), list(fresh.values())
+    step = max(settings.INGEST_EMBED_BATCH, 1)
+    for s in range(0, len(fresh_texts), step):
+        embs, normed = embed_texts(fresh_texts[s:s + step])
+        for h, fields, vec in zip(fresh_hashes[s:s + step], encode_vectors(embs, normed), normed):
+            vectors[h] = (fields, vec)
+    lap("embed")
+
+    # 4. bulk writes; ids are assigned here so partial failures can be matched up
+    now = datetime.datetime.utcnow()
+    docs = []
+    for i, chunk, h in new:
+        d = documents[i]
+        docs.append({
+            "_id": ObjectId(),
+            "source": d.get("source", "manual"),
+            "url": d["url"],
+            "title": d.get("title") or d["url"],
             "text": chunk,
-            "tags": [],
-            "created_at": datetime.datetime.utcnow()
-        }
-        res = db.knowledge_documents.insert_one(doc)
-        doc_id_str = str(res.inserted_id)
-
-        emb_doc = {
-            "doc_id": doc_id_str,
-            "embedding": embs[i].astype("float32").tolist(),
-            "normed_embedding": normed[i].astype("float32").tolist(),
-            "vector_model": settings.EMBEDDING_MODEL,
-            "created_at": datetime.datetime.utcnow()
-        }
-        db.embeddings.insert_one(emb_doc)
-
-        # Add to FAISS once
+            "tags": [str(t) for t in d.get("tags") or []],
+            **d.get("fields", {}),
+            "content_hash": h,
+            "created_at": now,
+        })
+    failed = _insert_many(db.knowledge_documents, docs)
+    lap("write_docs")
+
+    ok = [k for k in range(len(docs)) if k not in failed]
+    emb_rows = [{
+        "doc_id": str(docs[k]["_id"]),
+        **vectors[docs[k]["content_hash"]][0],
+        "content_hash": docs[k]["content_hash"],
+        "vector_model": settings.EMBEDDING_MODEL,
+        "created_at": now,
+    } for k in ok]
+    failed_emb = _insert_many(db.embeddings, emb_rows)
+    if failed_emb:
+        # a chunk without a vector is never retrieved; drop it so a re-run ingests it again
+        db.knowledge_documents.delete_many({"_id": {"$in": [docs[ok[j]]["_id"] for j in failed_emb]}})
+    written = [k for j, k in enumerate(ok) if j not in failed_emb]
+    # refresh the chunk cache with the new content (same fields top_k_documents projects)
+    doc_cache.put_many({str(docs[k]["_id"]): {f: docs[k][f] for f in ("_id", "text", "url", "title")} for k in written})
+    lap("write_embeddings")
+
+    # 5. one commit to the live FAISS index through the single index writer
+    if add_to_index and written:
         try:
-            faiss_idx.add_single(np.array(normed[i], dtype="float32"), doc_id_str)
+            normed = np.vstack([vectors[docs[k]["content_hash"]][1] for k in written]).astype("float32")
+            get_index_manager().add(normed, [str(docs[k]["_id"]) for k in written])
         except Exception as e:
             # swallow errors — index can be rebuilt later
-            print(f"[ingest] warning: faiss add_single failed for {doc_id_str}: {e}")
+            print(f"[ingest] warning: faiss add failed: {e}")
+    if written:
+        notify_corpus_changed()
+    lap("index_add")
 
-        inserted_ids.append(doc_id_str)
+    ids_by_key = dict(held)
+    new_ids = {d["url"]: [] for d in documents}
+    for k in written:
+        ids_by_key[(docs[k]["url"], docs[k]["content_hash"])] = str(docs[k]["_id"])
+        new_ids[docs[k]["url"]].append(str(docs[k]["_id"]))
+    doc_ids = {d["url"]: [] for d in documents}
+    for i, _, h in pending:
+        url = documents[i]["url"]
+        doc_id = ids_by_key.get((url, h))
+        if doc_id and doc_id not in doc_ids[url]:
+            doc_ids[url].append(doc_id)
 
-    return inserted_ids
+    result = {
+        "documents": len(documents),
+        "chunks": len(pending),
+        "inserted": len(written),
+        "embedded": len(fresh_texts),
+        "reused_vectors": reused,
+        "skipped": len(pending) - len(new),
+        "failed": len(new) - len(written),
+        "timings_ms": timings,
+        "doc_ids": doc_ids,
+        "new_ids": new_ids,
+    }
+    stages = " ".join(f"{k}={v:.0f}ms" for k, v in timings.items())
+    print(f"[ingest] {len(documents)} docs, {len(pending)} chunks: {len(written)} inserted "
+          f"({len(fresh_texts)} embedded, {reused} reused vectors), {result['skipped']} skipped; {stages}")
+    return result
+
+def ingest_document(url: str, title: str, raw_text: str, source: str = "manual"):
+    """
+    Ingest a single document's text (see ingest_documents).
+    Returns the doc_id strings of the document's chunks (existing + inserted).
+    """
+    result = ingest_documents([{"url": url, "title": title, "raw_text": raw_text, "source": source}])
+    return result["doc_ids"].get(url, [])
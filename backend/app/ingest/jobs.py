@@ -0,0 +1,204 @@
+# backend/app/ingest/jobs.py
+"""
+Background ingest jobs: fetch URLs / take raw text, then ingest_documents() on a bounded
+worker pool (INGEST_WORKERS threads, at most INGEST_MAX_PENDING queued jobs per process).
+
+Jobs live in db.ingest_jobs:
+    status: queued | running | done | failed, items, progress, result, errors, timestamps
+A worker claims a job atomically (queued -> running), so a job queued by several processes
+runs once. Jobs left queued or stale running by a restart are re-queued by recover_jobs();
+re-running one is safe because ingest skips chunks it already holds (content hash).
+Jobs submitted with a dedup_key are single-flight: while one is queued/running (its
+active_key is set; unique index), submitting the same key returns the existing job.
+"""
+import datetime
+import hashlib
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ..core.config import settings
+from ..db.mongo import db
+from ..scraper.fetcher import extract_text_from_html
+from ..scraper.async_fetcher import fetch_urls
+from .ingester import ingest_documents
+
+class IngestQueueFull(RuntimeError):
+    pass
+
+def _now():
+    return datetime.datetime.utcnow()
+
+def text_url(text: str) -> str:
+    # raw text has no url; a stable pseudo-url lets re-submitted text dedup like a re-scraped page
+    return "text:" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+class IngestJobRunner:
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="ingest")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, items: list, source: str = "api", dedup_key: str = None) -> dict:
+        """
+        Persist a job and queue it. items: [{"url"}] to fetch, or [{"text", "title", "url"?}];
+        either may carry "tags".
+        dedup_key: return the active job with this key instead of starting another one.
+        Raises IngestQueueFull when this process already has max_pending jobs waiting.
+        """
+        if dedup_key:
+            active = db.ingest_jobs.find_one({"active_key": dedup_key})
+            if active is not None:
+                return active
+        job = {
+            "_id": ObjectId(),
+            "status": "queued",
+            "source": source,
+            "items": items,
+            "progress": {"total": len(items), "fetched": 0, "failed": 0},
+            "result": None,
+            "errors": [],
+            "created_at": _now(),
+            "updated_at": _now(),
+        }
+        if dedup_key:
+            job["active_key"] = dedup_key
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise IngestQueueFull(f"{self._pending} ingest jobs already queued")
+            self._pending += 1
+        try:
+            db.ingest_jobs.insert_one(job)
+        except DuplicateKeyError:
+            # another request/process started the same job first
+            with self._lock:
+                self._pending -= 1
+            return db.ingest_jobs.find_one({"active_key": dedup_key}) or job
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        self._executor.submit(self._run, job["_id"])
+        return job
+
+    def enqueue_existing(self, job_id):
+        with self._lock:
+            self._pending += 1
+        self._executor.submit(self._run, job_id)
+
+    def stats(self) -> dict:
+        return {"pending": self._pending, "max_pending": self.max_pending, "workers": self._executor._max_workers}
+
+    def _run(self, job_id):
+        try:
+            # claim: another process (or a recovered copy) may have taken it already
+            job = db.ingest_jobs.find_one_and_update(
+                {"_id": job_id, "status": "queued"},
+                {"$set": {"status": "running", "started_at": _now(), "updated_at": _now()}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                return
+            self._execute(job)
+        except Exception as e:
+            print(f"[ingest_jobs] job {job_id} failed: {e}")
+            traceback.print_exc()
+            db.ingest_jobs.update_one({"_id": job_id}, {"$set": {
+                "status": "failed", "finished_at": _now(), "updated_at": _now()},
+                "$unset": {"active_key": ""},
+                "$push": {"errors": {"item": None, "error": str(e)}}})
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _execute(self, job: dict):
+        job_id = job["_id"]
+        errors = []
+        source = job.get("source", "api")
+        items = job["items"]
+        # item position -> text to ingest
+        texts = {}
+
+        def _progress(ok: bool):
+            inc = {"progress.fetched": 1} if ok else {"progress.failed": 1}
+            db.ingest_jobs.update_one({"_id": job_id}, {"$inc": inc, "$set": {"updated_at": _now()}})
+
+        by_url = {}
+        for pos, item in enumerate(items):
+            if item.get("text"):
+                texts[pos] = item["text"]
+                _progress(True)
+            else:
+                by_url.setdefault(item["url"], []).append(pos)
+
+        def _fetched(page):
+            # runs as each fetch completes, so progress and updated_at move during the fetch
+            # phase and recover_jobs() doesn't mistake a long fetch for a stalled job
+            for pos in by_url.get(page.url, ()):
+                try:
+                    if not page.ok:
+                        raise ValueError(page.error or "fetch failed or returned no content")
+                    text = extract_text_from_html(page.text)
+                    if not text or len(text.strip()) < 100:
+                        raise ValueError("extracted text too short")
+                    texts[pos] = text
+                    _progress(True)
+                except Exception as e:
+                    errors.append({"item": page.url, "error": str(e)})
+                    _progress(False)
+
+        if by_url:
+            # all urls are fetched concurrently (per-host limits, conditional GET cache)
+            fetch_urls(list(by_url), on_result=_fetched)
+        documents = []
+        for pos, item in enumerate(items):
+            if pos in texts:
+                url = item.get("url") or text_url(texts[pos])
+                documents.append({"url": url, "title": item.get("title") or url, "raw_text": texts[pos],
+                                  "source": source, "tags": item.get("tags", [])})
+
+        result = None
+        if documents:
+            result = ingest_documents(documents)
+            # per-url chunk counts instead of full id lists (keeps the job document small)
+            result["doc_ids"] = {u: len(ids) for u, ids in result["doc_ids"].items()}
+            result["new_ids"] = {u: len(ids) for u, ids in result["new_ids"].items()}
+        status = "done" if documents else "failed"
+        db.ingest_jobs.update_one({"_id": job_id}, {"$set": {
+            "status": status, "result": result, "finished_at": _now(), "updated_at": _now()},
+            "$unset": {"active_key": ""},
+            "$push": {"errors": {"$each": errors}}})
+        print(f"[ingest_jobs] job {job_id} {status}: {len(documents)} documents, {len(errors)} errors")
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_ingest_jobs() -> IngestJobRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = IngestJobRunner(settings.INGEST_WORKERS, settings.INGEST_MAX_PENDING)
+        return _runner
+
+def get_job(job_id: str):
+    try:
+        oid = ObjectId(job_id)
+    except (InvalidId, TypeError):
+        return None
+    return db.ingest_jobs.find_one({"_id": oid})
+
+def recover_jobs() -> int:
+    """Re-queue jobs a restart left queued, or running with no progress for INGEST_JOB_STALE_SECONDS."""
+    stale = _now() - datetime.timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+    db.ingest_jobs.update_many({"status": "running", "updated_at": {"$lt": stale}},
+                               {"$set": {"status": "queued", "updated_at": _now()}})
+    runner = get_ingest_jobs()
+    count = 0
+    for job in db.ingest_jobs.find({"status": "queued"}, {"_id": 1}).sort("created_at", 1):
+        runner.enqueue_existing(job["_id"])
+        count += 1
+    return count
@@ -1,6 +1,9 @@
 # backend/app/main.py
+from app.core.startup import (phase, mark_imported, print_startup_report, startup_report,
+                              begin_warmup, end_warmup, require_ready)
 import asyncio
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
@@ -13,18 +16,22 @@ import os, sys
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, BASE_DIR)
 
-from app.db.mongo import db
-from app.retriever.retriever import top_k_documents, get_index
+from app.db.mongo import db, ensure_indexes
+from app.retriever.retriever import top_k_documents, get_index, get_index_manager, prefill_doc_cache
 from app.rag.rag_engine import answer_query
+from app.rag.answer_cache import answer_cache
+from app.embeddings.embedder import embed_texts, get_model
+from app.sidecar.client import sidecar_enabled
 from app.api.v1 import admin
 from app.tasks.scheduler import start_scheduler
 from app.core.config import settings
-from app.scraper.fetcher import simple_fetch, extract_text_from_html, is_allowed
-from app.ingest.ingester import ingest_document
 
 from app.api.v1.practice import router as practice_router
 from app.api.v1.stream import router as stream_router
 from app.api.v1.answers import router as answers_router
+from app.api.v1.query import router as query_router
+from app.api.v1.ingest import router as ingest_router
+from app.ingest.jobs import recover_jobs, get_ingest_jobs
 
 app = FastAPI(title="Adaptive DSA Tutor API")
 
@@ -32,6 +39,8 @@ app.include_router(admin.router)
 app.include_router(practice_router)
 app.include_router(stream_router)
 app.include_router(answers_router)
+app.include_router(query_router)
+app.include_router(ingest_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -45,10 +54,21 @@ class QueryRequest(BaseModel):
     user_id: str
     query: str
     session_id: str | None = None
+    # optional metadata filter: {"source": ..., "url": ..., "concept"/"tags": ...}
+    filters: dict | None = None
 
 class QueryResponse(BaseModel):
     answer: str
     sources: list[str]
+    # set when the answer was served from the semantic answer cache
+    cache: dict | None = None
+    # "warming_up" while the knowledge base is still being seeded (answer is a placeholder)
+    status: str = "ok"
+    ingest_job_id: str | None = None
+
+WARMING_UP_ANSWER = ("The knowledge base is still being set up, so I can't answer from it yet. "
+                     "Please try again in a minute.")
+SEED_INGEST_KEY = "seed_fallback"
 
 SEED_URLS = [
     "https://www.geeksforgeeks.org/binary-search/",
@@ -64,7 +84,18 @@ SEED_URLS = [
 @app.get("/")
 def read_root():
     return {"status": "active", "service": "Adaptive Tutor Backend"}
-    
+
+# Liveness: answers as soon as the process serves HTTP, even while warmup is running
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+# Readiness: 503 until the background warmup (index, model, caches) has finished
+@app.get("/readyz")
+def readyz():
+    report = startup_report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
 # Keep-Alive Loop
 async def run_keep_alive():
     # Pings the backend every 10 minutes (600 seconds) 
@@ -83,87 +114,119 @@ async def run_keep_alive():
 
 @app.on_event("startup")
 async def startup_event():
-    # 1. Start Scheduler
-    start_scheduler()
-    
-    # 2. Initialize & Rebuild Brain (FAISS)
+    # Warmup runs in the background so the app serves /, /healthz and /readyz right away;
+    # query endpoints wait for it (see require_ready)
+    begin_warmup()
+    asyncio.create_task(run_warmup())
+
+    # Start Keep-Alive (to prevent sleeping)
+    asyncio.create_task(run_keep_alive())
+
+async def run_warmup():
     try:
-        idx = get_index()
-        
-        # Try loading from disk first
-        try:
-            idx.load()
-        except Exception:
-            pass # It's okay if file doesn't exist yet on Render
+        await asyncio.to_thread(warmup)
+    except Exception as e:
+        print("Warning: warmup failed:", e)
+        traceback.print_exc()
+    finally:
+        end_warmup()
+        print_startup_report()
+
+def warmup():
+    """
+    Background warmup, each step recorded as a startup phase:
+    DB indexes, scheduler, index load (local files or GridFS snapshot) + rebuild/refresh,
+    interrupted ingest jobs, embedding model + one dummy encode, doc cache prefill from recent chats.
+    """
+    # 1. One-time DB setup (collection indexes; no longer done on import)
+    try:
+        with phase("db_indexes"):
+            ensure_indexes()
+    except Exception as e:
+        print("Warning: failed to ensure Mongo indexes:", e)
+
+    # 2. Start Scheduler
+    try:
+        with phase("scheduler"):
+            start_scheduler()
+    except Exception as e:
+        print("Warning: failed to start scheduler:", e)
+
+    # 3. Initialize & Rebuild Brain (FAISS)
+    try:
+        with phase("index_load"):
+            # First use loads from disk, or from the latest GridFS snapshot when Render wiped faiss_data/
+            manager = get_index_manager()
+            idx = get_index()
 
         # CHECK: Is the brain empty?
-        if not idx.index or idx.index.ntotal == 0:
-            print("Index is empty (Render cold start). Rebuilding from MongoDB...")
-            # This pulls the 60 docs from your image and puts them into RAM
-            count = idx.build_from_db() 
+        if idx.ntotal == 0:
+            print("Index is empty (no local files or snapshot). Rebuilding from MongoDB...")
+            with phase("index_rebuild"):
+                count = manager.rebuild(wait=True)
             print(f"Brain rebuilt! Loaded {count} documents.")
         else:
-            print(f"Index loaded from disk. Total documents: {idx.index.ntotal}")
-            
+            print(f"Index loaded (disk or snapshot). Total documents: {idx.ntotal}")
+            # catch up on embeddings written since the index was saved
+            with phase("index_refresh"):
+                result = manager.refresh(wait=True)
+            print(f"Index refreshed incrementally: {result}")
     except Exception as e:
         print("Warning: Failed to load FAISS index:", e)
         traceback.print_exc()
-        
-    # 3. Start Keep-Alive (to prevent sleeping)
-    asyncio.create_task(run_keep_alive())
 
-def get_docs(query_text):
+    # 4. Resume ingest jobs a restart interrupted
+    try:
+        with phase("ingest_jobs_recover"):
+            resumed = recover_jobs()
+        if resumed:
+            print(f"Re-queued {resumed} interrupted ingest jobs.")
+    except Exception as e:
+        print("Warning: failed to recover ingest jobs:", e)
+
+    # 5. Model + caches live in the sidecar when there is one
+    if sidecar_enabled():
+        return
+    try:
+        with phase("model_load"):
+            get_model()
+        with phase("dummy_encode"):
+            # first encode pays one-off costs (kernel selection, tokenizer init)
+            embed_texts(["warmup: binary search"])
+    except Exception as e:
+        print("Warning: failed to load the embedding model:", e)
+    try:
+        with phase("doc_cache_prefill"):
+            n = prefill_doc_cache(settings.WARMUP_DOC_PREFILL_CHATS)
+        print(f"Doc cache prefilled with {n} chunks.")
+    except Exception as e:
+        print("Warning: failed to prefill doc cache:", e)
+
+def get_docs(query_text, filters=None):
+    """
+    Returns (docs, ingest_job). When retrieval finds nothing (fresh, empty deployment) the
+    seed pages are queued for background ingestion and docs is empty; concurrent callers
+    share one seed job, so the request never waits on scraping.
+    """
     # 1) attempt retrieval from DB
-    docs = top_k_documents(query_text, k=5)
+    try:
+        docs = top_k_documents(query_text, k=5, filters=filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if docs and len(docs) >= 1:
-        return docs
-
-    # 2) fallback scraping — try each seed but do not crash on first failure
-    any_ingested = False
-    for url in SEED_URLS:
-        if not is_allowed(url):
-            print(f"[get_docs] skipped not allowed domain: {url}")
-            continue
-        try:
-            raw = simple_fetch(url)
-            if not raw:
-                print(f"[get_docs] fetch failed or returned no content for: {url}")
-                continue
-            text = extract_text_from_html(raw)
-            if not text or len(text.strip()) < 100:
-                print(f"[get_docs] extracted text too short for: {url}")
-                continue
-            ingest_document(url=url, title=url, raw_text=text, source="seed")
-            any_ingested = True
-        except Exception as e:
-            print(f"[get_docs] unexpected error while fetching/ingesting {url}: {e}")
-            traceback.print_exc()
-            continue
-
-    # 3) if we ingested anything, refresh index and re-run retrieval
-    if any_ingested:
-        try:
-            idx = get_index()
-            # If index is empty, build from DB. If non-empty, ingest already added vectors
-            if idx.index is None or getattr(idx.index, "ntotal", 0) == 0:
-                idx.build_from_db()
-            else:
-                # safe to call load to ensure doc_ids in memory if index was saved earlier
-                try:
-                    idx.load()
-                except Exception:
-                    pass
-        except Exception as e:
-            print("[get_docs] warning: failed to reload index in memory:", e)
+        return docs, None
+    if filters and get_index().ntotal > 0:
+        # the corpus has data, just nothing matching this filter; scraping seeds won't help
+        raise HTTPException(status_code=404, detail="No documents match the given filters.")
 
-        # rerun retrieval
-        docs = top_k_documents(query_text, k=5)
+    # 2) fallback: seed the corpus in the background (single-flight across requests/processes)
+    try:
+        job = get_ingest_jobs().submit([{"url": u} for u in SEED_URLS], source="seed", dedup_key=SEED_INGEST_KEY)
+    except Exception as e:
+        print(f"[get_docs] could not queue seed ingestion: {e}")
+        job = None
+    return [], job
 
-    # 4) final decision
-    if not docs:
-        raise HTTPException(status_code=404, detail="No relevant documents found, and fallback scraping failed.")
-    return docs
-    
 # accept both /v1/query and /v1/query/
 @app.post("/v1/query")
 @app.post("/v1/query/")
@@ -174,16 +237,48 @@ async def query_endpoint(req: QueryRequest):
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid session_id format.")
 
-    # Retrieve documents
-    docs = get_docs(req.query)
+    # Early queries wait for warmup (503 + Retry-After if it takes too long)
+    await require_ready()
+
+    # Retrieve documents (off the event loop, so concurrent requests can share a retrieval batch)
+    docs, ingest_job = await asyncio.to_thread(get_docs, req.query, req.filters)
+    if not docs:
+        # degraded answer right away; the seed job fills the corpus in the background
+        return QueryResponse(answer=WARMING_UP_ANSWER, sources=[], status="warming_up",
+                             ingest_job_id=str(ingest_job["_id"]) if ingest_job else None)
+    doc_ids = [str(d["doc"]["_id"]) for d in docs]
+    sources = [d["doc"]["url"] for d in docs]
 
-    # Generate answer
+    # Semantic cache: reuse a past answer to a near-identical query over the same chunks
+    # (the query embedding is already cached from retrieval, so this doesn't re-run the model)
+    query_vec = None
+    cached = None
     try:
-        answer = answer_query(req.query, docs)
+        _, normed = embed_texts([req.query], use_cache=True)
+        query_vec = normed[0]
+        cached = answer_cache.lookup(query_vec, doc_ids)
     except Exception as e:
-        # failed LLM; don't crash — return helpful error
-        print("LLM generation failed:", e)
-        raise HTTPException(status_code=500, detail="Failed to generate answer at the moment.")
+        print("Warning: answer cache lookup failed:", e)
+
+    cache_meta = None
+    if cached:
+        answer = cached["answer"]
+        cache_meta = {
+            "hit": True,
+            "similarity": cached["similarity"],
+            "cached_query": cached["query"],
+            "cached_at": datetime.datetime.utcfromtimestamp(cached["created_at"]).isoformat(),
+        }
+    else:
+        # Generate answer
+        try:
+            answer = answer_query(req.query, docs)
+        except Exception as e:
+            # failed LLM; don't crash — return helpful error
+            print("LLM generation failed:", e)
+            raise HTTPException(status_code=500, detail="Failed to generate answer at the moment.")
+        if query_vec is not None:
+            answer_cache.add(req.query, query_vec, answer, doc_ids, sources)
 
     # Log chat
     try:
@@ -194,12 +289,21 @@ async def query_endpoint(req: QueryRequest):
                 {"role": "user", "text": req.query},
                 {"role": "assistant", "text": answer}
             ],
-            "metadata": {"retrieved_docs": [d["doc"]["url"] for d in docs]},
+            "metadata": {
+                "retrieved_docs": sources,
+                "retrieved_doc_ids": doc_ids,
+                "cache_hit": bool(cached),
+            },
             "created_at": datetime.datetime.utcnow()
         }
+        if query_vec is not None and not cached:
+            # lets the answer cache warm itself from past chats after a restart
+            chat_rec["metadata"]["query_embedding"] = query_vec.astype("float32").tolist()
         db.chats.insert_one(chat_rec)
     except Exception:
         # logging should not break the response
         print("Warning: failed to log chat")
 
-    return QueryResponse(answer=answer, sources=[d["doc"]["url"] for d in docs])
+    return QueryResponse(answer=answer, sources=sources, cache=cache_meta)
+
+mark_imported()
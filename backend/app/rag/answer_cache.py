@@ -0,0 +1,151 @@
+# backend/app/rag/answer_cache.py
+"""
+Semantic answer cache for /v1/query.
+A small FAISS index over past query embeddings (warmed from db.chats) lets a
+near-identical question reuse a stored answer, provided retrieval returned the
+same chunks it was generated from.
+"""
+import datetime
+import threading
+import time
+import numpy as np
+from ..core.config import settings
+from ..core.startup import lazy_import
+from ..db.mongo import db
+from ..retriever.faiss_index import add_corpus_listener
+
+faiss = lazy_import("faiss")
+
+class AnswerCache:
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reset()
+        self.hits = 0
+        self.misses = 0
+
+    def _reset(self):
+        self._index = None
+        self.entries = []
+
+    @property
+    def index(self):
+        # created on first use so importing this module doesn't load faiss
+        if self._index is None:
+            self._index = faiss.IndexFlatIP(self.dim)
+        return self._index
+
+    def _warm_from_chats(self):
+        """Load recent chats that recorded their query embedding."""
+        self._loaded = True
+        since = datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.ANSWER_CACHE_TTL_SECONDS)
+        cursor = db.chats.find(
+            {"created_at": {"$gte": since}, "metadata.query_embedding": {"$exists": True}},
+            {"messages": 1, "metadata": 1, "created_at": 1},
+        ).sort("created_at", -1).limit(settings.ANSWER_CACHE_MAX_ENTRIES)
+        vecs, entries = [], []
+        for chat in cursor:
+            try:
+                meta = chat.get("metadata") or {}
+                msgs = chat.get("messages") or []
+                vec = np.asarray(meta["query_embedding"], dtype="float32").reshape(-1)
+                if vec.shape[0] != self.dim or len(msgs) < 2 or meta.get("cache_hit"):
+                    continue
+                vecs.append(vec)
+                entries.append({
+                    "query": msgs[0].get("text"),
+                    "answer": msgs[1].get("text"),
+                    "doc_ids": list(meta.get("retrieved_doc_ids") or []),
+                    "sources": list(meta.get("retrieved_docs") or []),
+                    "created_at": chat["created_at"].replace(tzinfo=datetime.timezone.utc).timestamp(),
+                })
+            except Exception:
+                continue
+        if vecs:
+            # oldest first, matching the order add() appends in
+            vecs.reverse()
+            entries.reverse()
+            self.index.add(np.vstack(vecs))
+            self.entries = entries
+            print(f"[answer_cache] warmed with {len(entries)} past answers")
+
+    def lookup(self, normed_query: np.ndarray, doc_ids: list):
+        """
+        Return a cached entry for a similar query whose answer was generated from the
+        same retrieved chunks, or None.
+        """
+        if not settings.ANSWER_CACHE_ENABLED:
+            return None
+        vec = np.ascontiguousarray(normed_query, dtype="float32").reshape(1, -1)
+        wanted = sorted(str(d) for d in doc_ids)
+        now = time.time()
+        with self._lock:
+            if not self._loaded:
+                try:
+                    self._warm_from_chats()
+                except Exception as e:
+                    print("[answer_cache] warning: failed to warm from chats:", e)
+            if self.index.ntotal == 0:
+                self.misses += 1
+                return None
+            D, I = self.index.search(vec, min(5, self.index.ntotal))
+            for score, idx in zip(D[0], I[0]):
+                if idx < 0 or score < settings.ANSWER_CACHE_THRESHOLD:
+                    break
+                entry = self.entries[idx]
+                if now - entry["created_at"] > settings.ANSWER_CACHE_TTL_SECONDS:
+                    continue
+                if sorted(entry["doc_ids"]) != wanted:
+                    continue
+                self.hits += 1
+                return {**entry, "similarity": float(score)}
+            self.misses += 1
+            return None
+
+    def add(self, query: str, normed_query: np.ndarray, answer: str, doc_ids: list, sources: list):
+        if not settings.ANSWER_CACHE_ENABLED:
+            return
+        vec = np.ascontiguousarray(normed_query, dtype="float32").reshape(1, -1)
+        with self._lock:
+            if len(self.entries) >= settings.ANSWER_CACHE_MAX_ENTRIES:
+                self._prune()
+            self.index.add(vec)
+            self.entries.append({
+                "query": query,
+                "answer": answer,
+                "doc_ids": [str(d) for d in doc_ids],
+                "sources": list(sources),
+                "created_at": time.time(),
+            })
+
+    def _prune(self):
+        # drop expired entries and the oldest half of the rest, then rebuild the small index
+        now = time.time()
+        keep = [i for i, e in enumerate(self.entries) if now - e["created_at"] <= settings.ANSWER_CACHE_TTL_SECONDS]
+        keep = keep[len(keep) // 2:]
+        vecs = self.index.reconstruct_n(0, self.index.ntotal)[keep] if keep else None
+        entries = [self.entries[i] for i in keep]
+        self._reset()
+        if vecs is not None:
+            self.index.add(vecs)
+            self.entries = entries
+
+    def invalidate(self):
+        """Drop every cached answer (call when the knowledge corpus changes)."""
+        with self._lock:
+            self._reset()
+            # past chats predate the change, so don't re-warm from them
+            self._loaded = True
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+answer_cache = AnswerCache(settings.EMBEDDING_DIM)
+add_corpus_listener(answer_cache.invalidate)
@@ -0,0 +1,122 @@
+# backend/app/retriever/batcher.py
+"""
+Micro-batcher for retrieval: concurrent top_k_documents() calls are collected for up to
+QUERY_MICROBATCH_MAX_WAIT_MS (or QUERY_MICROBATCH_MAX_ITEMS queries) and served with one
+batched embed, one FAISS search per distinct filter set and one Mongo hydration.
+Works for threadpool callers (search) and coroutines (asearch).
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from ..core.config import settings
+from .postings import normalize_filters
+
+class QueryBatcher:
+    def __init__(self, run_batch, max_wait_ms: float = None, max_items: int = None):
+        """
+        run_batch(queries, k, filters) -> list of doc lists; called from the batcher thread,
+        once per filter group per batch.
+        """
+        self._run_batch = run_batch
+        self.max_wait_ms = settings.QUERY_MICROBATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        self.max_items = max(int(max_items or settings.QUERY_MICROBATCH_MAX_ITEMS), 1)
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        # metrics
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+        self._max_depth = 0
+        self._wait_ms_total = 0.0
+        self._run_ms_total = 0.0
+        self._size_hist = {"1": 0, "2-4": 0, "5-16": 0, "17-64": 0, "65+": 0}
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="query-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, query: str, k: int = 5, filters: dict = None) -> Future:
+        """Queue one query; the Future resolves to its doc list. Bad filters raise here."""
+        filters = normalize_filters(filters)
+        fut = Future()
+        with self._cond:
+            self._ensure_thread()
+            self._pending.append((query, int(k), filters, fut, time.perf_counter()))
+            self._max_depth = max(self._max_depth, len(self._pending))
+            self._cond.notify()
+        return fut
+
+    def search(self, query: str, k: int = 5, filters: dict = None):
+        return self.submit(query, k, filters).result()
+
+    async def asearch(self, query: str, k: int = 5, filters: dict = None):
+        return await asyncio.wrap_future(self.submit(query, k, filters))
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # the first waiter opens the window; fill it until full or the deadline passes
+            deadline = self._pending[0][4] + self.max_wait_ms / 1000.0
+            while len(self._pending) < self.max_items:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._pending), self.max_items)
+            return [self._pending.popleft() for _ in range(n)]
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            # one search per distinct filter set (filters apply to every row of a FAISS call)
+            groups = {}
+            for item in batch:
+                key = json.dumps(item[2], sort_keys=True) if item[2] else ""
+                groups.setdefault(key, []).append(item)
+            for items in groups.values():
+                items = [it for it in items if it[3].set_running_or_notify_cancel()]
+                if not items:
+                    continue
+                k = max(it[1] for it in items)
+                try:
+                    results = self._run_batch([it[0] for it in items], k, items[0][2])
+                    for it, docs in zip(items, results):
+                        it[3].set_result(docs[:it[1]])
+                except Exception as e:
+                    for it in items:
+                        it[3].set_exception(e)
+            self._record(batch, started)
+
+    def _record(self, batch: list, started: float):
+        now = time.perf_counter()
+        n = len(batch)
+        self._batches += 1
+        self._items += n
+        self._max_batch = max(self._max_batch, n)
+        self._wait_ms_total += sum(started - it[4] for it in batch) * 1000
+        self._run_ms_total += (now - started) * 1000
+        bucket = "1" if n == 1 else "2-4" if n <= 4 else "5-16" if n <= 16 else "17-64" if n <= 64 else "65+"
+        self._size_hist[bucket] += 1
+
+    def stats(self) -> dict:
+        batches = max(self._batches, 1)
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_items": self.max_items,
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self._max_depth,
+            "batches": self._batches,
+            "queries": self._items,
+            "avg_batch_size": round(self._items / batches, 2),
+            "max_batch_size": self._max_batch,
+            "batch_size_histogram": dict(self._size_hist),
+            "avg_queue_wait_ms": round(self._wait_ms_total / max(self._items, 1), 3),
+            "avg_batch_ms": round(self._run_ms_total / batches, 3),
+        }
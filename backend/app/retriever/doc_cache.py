@@ -0,0 +1,104 @@
+# backend/app/retriever/doc_cache.py
+"""
+Bounded in-process cache for hydrated knowledge_documents chunks.
+LRU eviction with a TTL, capped by entry count and (approximate) bytes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from ..core.config import settings
+
+def _doc_size(doc: dict) -> int:
+    # approximate payload size: string fields dominate (text/url/title)
+    size = 64
+    for v in doc.values():
+        if isinstance(v, str):
+            size += len(v.encode("utf-8"))
+        else:
+            size += 32
+    return size
+
+class DocCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()  # doc_id -> (doc, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, doc_ids) -> dict:
+        """Return {doc_id: doc} for cached, unexpired ids; updates LRU order and counters."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for doc_id in doc_ids:
+                entry = self._data.get(doc_id)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                doc, size, expires_at = entry
+                if expires_at < now:
+                    self._drop(doc_id)
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(doc_id)
+                found[doc_id] = doc
+                self.hits += 1
+        return found
+
+    def put_many(self, docs_by_id: dict):
+        if self.max_entries <= 0 or self.max_bytes <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            for doc_id, doc in docs_by_id.items():
+                size = _doc_size(doc)
+                if size > self.max_bytes:
+                    continue
+                if doc_id in self._data:
+                    self._drop(doc_id)
+                self._data[doc_id] = (doc, size, expires_at)
+                self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, doc_ids=None):
+        """Drop the given ids, or everything when doc_ids is None."""
+        with self._lock:
+            if doc_ids is None:
+                self._data.clear()
+                self._bytes = 0
+                return
+            for doc_id in doc_ids:
+                if doc_id in self._data:
+                    self._drop(doc_id)
+
+    def _drop(self, doc_id):
+        _, size, _ = self._data.pop(doc_id)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+doc_cache = DocCache(
+    max_entries=settings.DOC_CACHE_MAX_ENTRIES,
+    max_bytes=settings.DOC_CACHE_MAX_BYTES,
+    ttl_seconds=settings.DOC_CACHE_TTL_SECONDS,
+)
@@ -1,104 +1,1318 @@
 # backend/app/retriever/faiss_index.py
-import faiss
 import numpy as np
 import os
+import json
+import math
+import struct
+import threading
+import time
+import datetime
 from ..core.config import settings
+from ..core.startup import lazy_import
 from ..db.mongo import db
+from ..embeddings.vector_codec import VECTOR_FIELDS, decode_rows
+from .doc_cache import doc_cache
+from . import snapshot_store
+from .index_lock import index_files_lock, is_snapshot_publisher
+
+faiss = lazy_import("faiss")
+from .postings import Postings, normalize_filters
 
 # Ensure index dir exists
 idx_dir = os.path.dirname(settings.FAISS_INDEX_PATH)
 if idx_dir:
     os.makedirs(idx_dir, exist_ok=True)
 
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8")
+# compact-code types searched in two stages: codes first, then an exact re-rank from .vecs
+QUANTIZED_TYPES = ("sq8",)
+# types whose search scans every vector (filters never come up short)
+_EXHAUSTIVE_TYPES = ("flat", "sq8")
+
+# delta log layout: header = magic, dim (u32);
+# each record = id length (u16), utf-8 id bytes, dim float32 values
+_DELTA_MAGIC = b"FDL2"
+_DELTA_HEADER = struct.Struct("<4sI")
+# earlier logs also stored the main segment size after dim; read, never written
+_DELTA_MAGIC_V1 = b"FDLT"
+_DELTA_HEADER_V1 = struct.Struct("<4sIQ")
+_DELTA_ID_LEN = struct.Struct("<H")
+
+# one GridFS upload at a time; inode numbers of the file set last uploaded
+_publish_lock = threading.Lock()
+_published_files = None
+
+# callbacks run when the knowledge corpus changes (rebuild / ingest), e.g. answer cache invalidation
+_corpus_listeners = []
+
+def add_corpus_listener(fn):
+    _corpus_listeners.append(fn)
+
+def notify_corpus_changed():
+    for fn in list(_corpus_listeners):
+        try:
+            fn()
+        except Exception as e:
+            print("[faiss] warning: corpus listener failed:", e)
+
+def _mmap_flag():
+    # IO_FLAG_MMAP_IFC maps flat codes in place (newer faiss); IO_FLAG_MMAP only maps IVF lists
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+def _is_object_id(s: str) -> bool:
+    if len(s) != 24:
+        return False
+    try:
+        bytes.fromhex(s)
+        return True
+    except ValueError:
+        return False
+
+def encode_id_map(doc_ids) -> np.ndarray:
+    """
+    Pack doc ids for the binary id map.
+    ObjectId hex strings become an (n, 12) uint8 array; anything else falls back to fixed-width unicode.
+    """
+    if isinstance(doc_ids, DocIdMap):
+        return np.asarray(doc_ids.array)
+    doc_ids = [str(d) for d in doc_ids]
+    if all(_is_object_id(d) for d in doc_ids):
+        buf = b"".join(bytes.fromhex(d) for d in doc_ids)
+        return np.frombuffer(buf, dtype=np.uint8).reshape(len(doc_ids), 12)
+    return np.array(doc_ids, dtype=str)
+
+class DocIdMap:
+    """
+    Read-only, list-like view over a (possibly memory-mapped) encoded id map.
+    Indexing returns the doc id string, so callers can treat it like the old list.
+    """
+
+    def __init__(self, arr: np.ndarray):
+        self._arr = arr
+        self._packed = arr.dtype == np.uint8
+
+    def __len__(self):
+        return self._arr.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if self._packed:
+            return self._arr[i].tobytes().hex()
+        return str(self._arr[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self) -> int:
+        return self._arr.nbytes
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._arr
+
+def _packed(doc_ids):
+    """12-byte view of an id collection if it is (or can be) packed as ObjectIds, else None."""
+    if isinstance(doc_ids, DocIdMap):
+        arr = doc_ids.array
+    else:
+        doc_ids = [str(d) for d in doc_ids]
+        if not all(_is_object_id(d) for d in doc_ids):
+            return None
+        arr = encode_id_map(doc_ids)
+    if arr.dtype != np.uint8:
+        return None
+    return np.ascontiguousarray(arr).view("S12").ravel()
+
+def id_membership(haystack, needles) -> np.ndarray:
+    """
+    Boolean mask over needles: which appear in haystack (DocIdMaps or lists of ids).
+    Packed ObjectIds are compared as 12-byte strings with numpy, without building Python sets.
+    """
+    a, b = _packed(needles), _packed(haystack)
+    if a is not None and b is not None:
+        return np.isin(a, b)
+    have = {str(d) for d in haystack}
+    return np.array([str(d) in have for d in needles], dtype=bool)
+
+class SortedIds:
+    """
+    Sorted copy of an id map (minus `exclude` positions) for repeated membership tests:
+    np.searchsorted per lookup instead of an np.isin pass over the whole map.
+    """
+
+    def __init__(self, doc_ids, exclude: np.ndarray = None):
+        keys = _packed(doc_ids) if len(doc_ids) else None
+        self._packed = keys is not None
+        if keys is None:
+            keys = np.asarray(doc_ids.array) if isinstance(doc_ids, DocIdMap) else np.array([str(d) for d in doc_ids], dtype=str)
+        if exclude is not None and exclude.size:
+            keys = np.delete(keys, exclude)
+        self._keys = np.sort(keys)
+
+    def contains(self, doc_ids) -> np.ndarray:
+        doc_ids = [str(d) for d in doc_ids]
+        mask = np.zeros(len(doc_ids), dtype=bool)
+        if not doc_ids or self._keys.size == 0:
+            return mask
+        if self._packed:
+            # a packed map holds only ObjectIds
+            valid = np.array([_is_object_id(d) for d in doc_ids], dtype=bool)
+            if not valid.any():
+                return mask
+            needles = np.frombuffer(b"".join(bytes.fromhex(d) for d, v in zip(doc_ids, valid) if v), dtype="S12")
+        else:
+            valid = np.ones(len(doc_ids), dtype=bool)
+            needles = np.array(doc_ids, dtype=str)
+        pos = np.minimum(np.searchsorted(self._keys, needles), self._keys.size - 1)
+        mask[valid] = self._keys[pos] == needles
+        return mask
+
+def first_occurrences(doc_ids: list, keep: np.ndarray = None) -> np.ndarray:
+    """keep (default all True) with every repeat of an id already kept earlier in doc_ids cleared."""
+    keep = np.ones(len(doc_ids), dtype=bool) if keep is None else keep.copy()
+    seen = set()
+    for i, doc_id in enumerate(doc_ids):
+        if keep[i]:
+            if doc_id in seen:
+                keep[i] = False
+            seen.add(doc_id)
+    return keep
+
+def concat_ids(doc_ids, more: list):
+    """doc_ids + more, staying packed when both sides are ObjectIds."""
+    if isinstance(doc_ids, DocIdMap):
+        extra = encode_id_map(more) if more else None
+        if extra is None or extra.dtype == doc_ids.array.dtype == np.uint8:
+            arr = np.asarray(doc_ids.array) if extra is None else np.concatenate([doc_ids.array, extra])
+            return DocIdMap(arr)
+    return list(doc_ids) + [str(d) for d in more]
+
+def _watermark_key(e: dict):
+    # embeddings written before created_at existed sort first
+    return (e.get("created_at") or datetime.datetime.min, e["_id"])
+
+EMBEDDING_PROJECTION = {**VECTOR_FIELDS, "doc_id": 1, "created_at": 1}
+
+def _batched(cursor, size: int):
+    batch = []
+    for row in cursor:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _vectors_from_rows(rows, dim: int):
+    """
+    Decode a batch of db.embeddings rows (packed or legacy) into one normalized (n, dim)
+    float32 matrix. Returns (matrix, indices of the rows that were kept); rows with a
+    missing, malformed or wrong-size vector are skipped.
+    """
+    mat, keep = decode_rows(rows, dim)
+    # one vectorized normalization per batch (zero vectors are left as-is);
+    # also undoes float16 rounding drift on packed rows
+    if keep:
+        faiss.normalize_L2(mat)
+    return mat, keep
+
+def _open_vectors(path: str, dim: int):
+    """Read-only memory map of a raw float32 .vecs file as an (n, dim) matrix."""
+    if os.path.getsize(path) == 0:
+        return np.zeros((0, dim), dtype="float32")
+    return np.memmap(path, dtype="float32", mode="r").reshape(-1, dim)
+
+def _rerank(normed_vectors, I, full_vectors, top_k):
+    """
+    Second stage of a quantized search: re-score the stage-one candidates `I`
+    with full-precision vectors and keep the best top_k per query.
+    """
+    nq, k1 = I.shape
+    valid = (I >= 0) & (I < full_vectors.shape[0])
+    # only the candidate rows are read from the memory map
+    vecs = np.asarray(full_vectors[np.where(valid, I, 0).ravel()], dtype="float32").reshape(nq, k1, -1)
+    scores = np.einsum("qd,qkd->qk", normed_vectors, vecs)
+    scores[~valid] = -np.inf
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+    D = np.take_along_axis(scores, order, axis=1).astype("float32")
+    I = np.take_along_axis(I, order, axis=1)
+    I[~np.isfinite(D)] = -1
+    return D, I
+
+def _private_copy(index, mmapped: bool):
+    """
+    Writable in-memory copy of an index segment. Mapped indexes are read-only and clones keep
+    the mapping, so they are round-tripped through serialize (never re-read from the shared
+    .idx, which another worker may have replaced since this one mapped it).
+    """
+    if mmapped:
+        return faiss.deserialize_index(faiss.serialize_index(index))
+    return faiss.clone_index(index)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _atomic_write(path: str, write_fn):
+    """Write to a temp file then rename, so mmapped readers keep the old inode intact."""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    write_fn(tmp)
+    os.replace(tmp, path)
+
+def choose_index_type(ntotal: int, recall_target: float = None) -> str:
+    """
+    Pick an index type from corpus size and recall target.
+    - small corpora: exact flat scan is cheap enough
+    - mid-size: HNSW (high recall) or IVF-Flat
+    - very large: IVF-PQ keeps memory bounded when some recall can be traded
+    """
+    if recall_target is None:
+        recall_target = settings.FAISS_RECALL_TARGET
+    if ntotal < 10_000:
+        return "flat"
+    if recall_target >= 0.99:
+        return "flat" if ntotal < 200_000 else "hnsw"
+    if ntotal < 1_000_000:
+        return "hnsw" if recall_target >= 0.9 else "ivf_flat"
+    return "ivf_flat" if recall_target >= 0.9 else "ivf_pq"
+
+def _nlist_for(ntotal: int, n_train: int) -> int:
+    # ~4*sqrt(n) lists, but never more than the training sample can support (~39 points per centroid)
+    nlist = int(4 * math.sqrt(max(ntotal, 1)))
+    nlist = min(nlist, max(1, n_train // 39), 65536)
+    return max(nlist, 1)
+
+def _pq_m_for(dim: int) -> int:
+    # largest sub-quantizer count <= dim/8 that divides dim
+    for m in range(max(dim // 8, 1), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def make_index(index_type: str, dim: int, ntotal: int = 0, n_train: int = 0):
+    """
+    Create an empty (possibly untrained) inner-product index of the given type.
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "hnsw":
+        return faiss.index_factory(dim, "HNSW32,Flat", faiss.METRIC_INNER_PRODUCT)
+    if index_type == "ivf_flat":
+        nlist = _nlist_for(ntotal, n_train)
+        return faiss.index_factory(dim, f"IVF{nlist},Flat", faiss.METRIC_INNER_PRODUCT)
+    if index_type == "ivf_pq":
+        nlist = _nlist_for(ntotal, n_train)
+        return faiss.index_factory(dim, f"IVF{nlist},PQ{_pq_m_for(dim)}x8", faiss.METRIC_INNER_PRODUCT)
+    if index_type == "sq8":
+        # 1 byte per dimension (4x smaller than float32); needs a short training pass for value ranges
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"unknown FAISS index type: {index_type}")
+
+def _kind_of(index) -> str:
+    # infer the index type of an index read from disk (used when no .conf exists)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+    except Exception:
+        return "flat"
+
 class FaissIndex:
     """
     Lightweight FAISS wrapper.
     - stores index in settings.FAISS_INDEX_PATH + .idx
-    - stores doc_id list in .meta file (one id per line)
+    - stores the doc_id map in .ids.npy (12-byte ObjectIds; legacy text .meta is still read)
+    - stores the index type choice in .conf (json) so load()/build_from_db() honor it
+    - rebuilds and a timer upload a checksummed snapshot to GridFS (publish_snapshot);
+      load() restores it when the local files are missing
+    - quantized types (sq8) also keep full-precision rows in a raw float32 .vecs file,
+      memory-mapped and used only to re-rank each query's shortlist
+    - new vectors go to a small in-memory delta segment backed by an append-only
+      .delta.<pid> log per process; load() replays them and compact() folds it into the main index
+    - mutations replace segments instead of changing them in place, so searches
+      need no lock; callers must still serialize writers (see IndexManager)
     """
 
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, index_type: str = None):
         self.dim = dim
+        # configured type ("auto" or one of INDEX_TYPES); an explicit arg wins over the persisted choice
+        self._type_pinned = index_type is not None
+        self.index_type = index_type or settings.FAISS_INDEX_TYPE
+        if self.index_type != "auto" and self.index_type not in INDEX_TYPES:
+            raise ValueError(f"unknown FAISS index type: {self.index_type}")
+        # resolved type of the index currently held in memory
+        self.index_kind = "flat"
         # create a fresh index in memory; may be replaced by load()
         self.index = faiss.IndexFlatIP(self.dim)
         self.doc_ids = []
+        # delta segment: vectors added since the last full save, swapped as one (index, ids) tuple
+        self._delta = (faiss.IndexFlatIP(self.dim), [])
+        self._delta_since = None
+        self._lock = threading.RLock()
+        # bumped by IndexManager for each new snapshot; persisted in .conf
+        self.generation = 0
+        # (created_at, _id) of the newest db.embeddings row indexed, for incremental refresh
+        self.watermark = None
+        # main-index positions of deleted docs, for index types without order-preserving remove_ids
+        self.tombstones = np.zeros(0, dtype="int64")
+        # True when self.index is memory-mapped (read-only; must not be added to)
+        self._mmapped = False
+        # full-precision rows aligned with the main index, for re-ranking quantized types (mmapped .vecs)
+        self.full_vectors = None
+        # metadata postings for filtered search: the main ones are read from Mongo once per
+        # loaded/rebuilt segment (compact() folds the delta postings in), the delta ones
+        # grow with the delta; _main_version changes whenever the main positions do
+        self._postings = None
+        self._delta_postings = None
+        self._delta_postings_n = 0
+        self._main_version = 0
+        self._postings_lock = threading.RLock()
+        # held while the main postings are read from Mongo, so concurrent first queries share one scan
+        self._postings_build_lock = threading.Lock()
+        # (doc_ids, tombstones, SortedIds) for contains(); rebuilt when either is replaced
+        self._main_view = None
         # if files exist, don't auto-load here (call load explicitly)
         # but keep index initialized
 
+    @property
+    def delta_index(self):
+        return self._delta[0]
+
+    @property
+    def delta_ids(self):
+        return self._delta[1]
+
+    @property
+    def ntotal(self) -> int:
+        main = getattr(self.index, "ntotal", 0) if self.index is not None else 0
+        return main + self.delta_index.ntotal - self.tombstones.size
+
+    def _resolve_type(self, ntotal: int) -> str:
+        if self.index_type == "auto":
+            return choose_index_type(ntotal)
+        return self.index_type
+
+    def _sample_from_db(self, n: int) -> np.ndarray:
+        """Pull a random sample of normalized vectors from db.embeddings for training."""
+        pipeline = [
+            {"$sample": {"size": int(n)}},
+            {"$project": VECTOR_FIELDS},
+        ]
+        mat, _ = _vectors_from_rows(list(db.embeddings.aggregate(pipeline)), self.dim)
+        return mat
+
+    def train(self, sample: np.ndarray = None):
+        """
+        Train the current index if it needs it (IVF variants).
+        sample: optional training matrix; defaults to a $sample from db.embeddings.
+        """
+        if self.index.is_trained:
+            return
+        if sample is None:
+            sample = self._sample_from_db(settings.FAISS_TRAIN_SAMPLE)
+        sample = np.ascontiguousarray(sample, dtype="float32")
+        print(f"[faiss] training {self.index_kind} index on {sample.shape[0]} vectors")
+        self.index.train(sample)
+
     def add_single(self, normed_vector: np.ndarray, doc_id: str):
-        vec = normed_vector.reshape(1, -1).astype("float32")
-        if self.index is None:
-            self.index = faiss.IndexFlatIP(self.dim)
-            self.doc_ids = []
-        self.index.add(vec)
-        self.doc_ids.append(doc_id)
-        # persist index & meta
+        self.add(normed_vector.reshape(1, -1), [doc_id])
+
+    def add(self, normed_vectors: np.ndarray, doc_ids: list):
+        """
+        Append vectors to the delta segment. Only the new records are written to disk
+        (this process's .delta.<pid> log); the main index is rewritten by compact().
+        """
+        mat = np.ascontiguousarray(normed_vectors, dtype="float32").reshape(-1, self.dim)
+        doc_ids = [str(d) for d in doc_ids]
+        if mat.shape[0] != len(doc_ids):
+            raise ValueError("normed_vectors and doc_ids length mismatch")
+        if not doc_ids:
+            return
+        with self._lock:
+            if self.index is None:
+                self.index = faiss.IndexFlatIP(self.dim)
+                self.index_kind = "flat"
+                self.doc_ids = []
+            try:
+                self._append_delta_log(mat, doc_ids)
+            except Exception as e:
+                print("[faiss] warning: failed to append delta log:", e)
+            # copy-on-write: the delta is small, and concurrent searches keep using the old one
+            old_index, old_ids = self._delta
+            new_index = faiss.IndexFlatIP(self.dim)
+            if old_index.ntotal:
+                new_index.add(old_index.reconstruct_n(0, old_index.ntotal))
+            new_index.add(mat)
+            self._delta = (new_index, old_ids + doc_ids)
+            if self._delta_since is None:
+                self._delta_since = time.time()
+
+    def _delta_path(self):
+        # one log per process: workers sharing FAISS_INDEX_PATH never reset or interleave each other's records
+        return f"{settings.FAISS_INDEX_PATH}.delta.{os.getpid()}"
+
+    def _delta_logs(self):
+        """(path, pid) of every delta log next to the index; pid is None for the legacy shared .delta."""
+        base = settings.FAISS_INDEX_PATH + ".delta"
+        folder = os.path.dirname(base) or "."
+        logs = []
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if path == base:
+                logs.append((path, None))
+            elif path.startswith(base + ".") and path[len(base) + 1:].isdigit():
+                logs.append((path, int(path[len(base) + 1:])))
+        return logs
+
+    def _delta_header(self) -> bytes:
+        # records are matched to the main segment by doc id on replay, not by position
+        return _DELTA_HEADER.pack(_DELTA_MAGIC, self.dim)
+
+    @staticmethod
+    def _delta_records(mat: np.ndarray, doc_ids: list) -> bytearray:
+        buf = bytearray()
+        for vec, doc_id in zip(mat, doc_ids):
+            raw_id = doc_id.encode("utf-8")
+            buf += _DELTA_ID_LEN.pack(len(raw_id))
+            buf += raw_id
+            buf += np.ascontiguousarray(vec, dtype="float32").tobytes()
+        return buf
+
+    def _append_delta_log(self, mat: np.ndarray, doc_ids: list):
+        path = self._delta_path()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, "ab") as f:
+            if new_file:
+                f.write(self._delta_header())
+            f.write(self._delta_records(mat, doc_ids))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read_delta_log(self, path: str):
+        """(vectors, doc_ids) of one log; a torn record at the tail is dropped."""
+        with open(path, "rb") as f:
+            data = f.read()
+        header = _DELTA_HEADER_V1 if data[:4] == _DELTA_MAGIC_V1 else _DELTA_HEADER
+        if len(data) < header.size:
+            return [], []
+        magic, dim = header.unpack_from(data, 0)[:2]
+        if magic not in (_DELTA_MAGIC, _DELTA_MAGIC_V1) or dim != self.dim:
+            print(f"[faiss] ignoring delta log with unexpected header: {path}")
+            return [], []
+        vec_bytes = 4 * self.dim
+        pos = header.size
+        vecs, ids = [], []
+        while pos + _DELTA_ID_LEN.size <= len(data):
+            (id_len,) = _DELTA_ID_LEN.unpack_from(data, pos)
+            end = pos + _DELTA_ID_LEN.size + id_len + vec_bytes
+            if end > len(data):
+                break
+            id_start = pos + _DELTA_ID_LEN.size
+            ids.append(data[id_start:id_start + id_len].decode("utf-8"))
+            vecs.append(np.frombuffer(data, dtype="float32", count=self.dim, offset=id_start + id_len))
+            pos = end
+        return vecs, ids
+
+    def _replay_delta_log(self):
+        """
+        Rebuild the in-memory delta segment from the delta logs (called by load()).
+        Every worker's log is read, since their adds are just as valid here. Records are
+        deduped by doc id against the main index (a compaction may have outlived its log
+        removal, or a removal shrunk the index). Logs of exited processes are moved into
+        this process's log.
+        """
+        self._delta = (faiss.IndexFlatIP(self.dim), [])
+        self._delta_since = None
+        self._reset_delta_postings()
+        vecs, ids, adopted, since, n_logs = [], [], [], None, 0
+        for path, pid in self._delta_logs():
+            try:
+                log_vecs, log_ids = self._read_delta_log(path)
+                mtime = os.path.getmtime(path)
+            except OSError as e:
+                print(f"[faiss] warning: failed to read delta log {path}: {e}")
+                continue
+            vecs.extend(log_vecs)
+            ids.extend(log_ids)
+            if log_ids:
+                since = mtime if since is None else min(since, mtime)
+                n_logs += 1
+            if pid is None or pid == os.getpid() or not _pid_alive(pid):
+                adopted.append(path)
+        keep = first_occurrences(ids, ~self._main_id_view().contains(ids))
+        vecs = [v for v, k in zip(vecs, keep) if k]
+        ids = [d for d, k in zip(ids, keep) if k]
+        own = self._delta_path()
+        if vecs:
+            mat = np.vstack(vecs)
+            delta_index = faiss.IndexFlatIP(self.dim)
+            delta_index.add(mat)
+            self._delta = (delta_index, ids)
+            self._delta_since = since
+
+            def _write(tmp):
+                with open(tmp, "wb") as f:
+                    f.write(self._delta_header())
+                    f.write(self._delta_records(mat, ids))
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            _atomic_write(own, _write)
+            print(f"[faiss] replayed {len(ids)} vectors from {n_logs} delta log(s)")
+        for path in adopted:
+            if path != own or not vecs:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _reset_delta_postings(self):
+        with self._postings_lock:
+            self._delta_postings = None
+            self._delta_postings_n = 0
+
+    def _reset_main_postings(self):
+        with self._postings_lock:
+            self._postings = None
+            self._main_version += 1
+
+    def _reset_delta(self):
+        self._delta = (faiss.IndexFlatIP(self.dim), [])
+        self._delta_since = None
+        self._reset_delta_postings()
         try:
-            self.save()
-        except Exception as e:
-            print("[faiss] warning: failed to save index after add_single:", e)
+            os.remove(self._delta_path())
+        except FileNotFoundError:
+            pass
+
+    def compact(self):
+        """
+        Fold the delta segment into the main index and rewrite the index files once.
+        The merged index is built on the side and swapped in, so searches never see
+        a half-updated segment.
+        """
+        with self._lock:
+            delta_index, delta_ids = self._delta
+            n = delta_index.ntotal
+            if n == 0:
+                return 0
+            vecs = delta_index.reconstruct_n(0, n)
+            # a row both a refresh and ingest's add() appended, or one main already holds, goes in once
+            keep = first_occurrences(delta_ids, ~self._main_id_view().contains(delta_ids))
+            postings_ids = delta_ids
+            if not keep.all():
+                vecs = vecs[keep]
+                delta_ids = [d for d, k in zip(delta_ids, keep) if k]
+                print(f"[faiss] compaction dropped {n - len(delta_ids)} duplicate delta vectors")
+                n = len(delta_ids)
+                if n == 0:
+                    self._reset_delta()
+                    return 0
+            new_index = _private_copy(self.index, self._mmapped)
+            if not new_index.is_trained:
+                new_index.train(vecs)
+            new_index.add(vecs)
+            new_doc_ids = concat_ids(self.doc_ids, delta_ids)
+            if new_index.ntotal != len(new_doc_ids):
+                raise RuntimeError(f"compaction would write {new_index.ntotal} vectors "
+                                   f"with {len(new_doc_ids)} doc ids; index left unchanged")
+            postings = self._folded_postings(len(self.doc_ids), postings_ids, keep)
+            with index_files_lock():
+                full_vectors = self._append_vectors(vecs) if self.index_kind in QUANTIZED_TYPES else None
+                self._write_files(new_index, new_doc_ids)
+                with self._postings_lock:
+                    # ids first: positions only grow, so a reader pairing the old index with the new ids is fine
+                    self.full_vectors = full_vectors
+                    self.doc_ids = new_doc_ids
+                    self.index = new_index
+                    self._mmapped = False
+                    self._postings = postings
+                    self._main_version += 1
+                    self._reset_delta()
+                if settings.FAISS_MMAP:
+                    self._open_main()
+            print(f"[faiss] compacted {n} delta vectors into main index (ntotal={self.index.ntotal})")
+            return n
+
+    def _folded_postings(self, main_n: int, delta_ids: list, keep: np.ndarray):
+        """
+        Main postings with the kept delta rows' appended after main_n, so a compaction doesn't
+        send the next filtered query back to Mongo for the whole corpus. Only delta vectors
+        no filtered query has seen yet are looked up. None if the main postings were never built.
+        """
+        with self._postings_lock:
+            # under the lock: a filtered query may be extending the delta postings
+            if self._postings is None:
+                return None
+            covered = self._delta_postings_n if self._delta_postings is not None else 0
+            delta = self._delta_postings.remapped(keep[:covered]) if covered else Postings()
+            merged = self._postings.merged(delta, main_n)
+        base = main_n + int(keep[:covered].sum())
+        rest = [d for d, k in zip(delta_ids[covered:], keep[covered:]) if k]
+        for offset, meta in enumerate(self._load_doc_meta(rest)):
+            merged.add(base + offset, meta)
+        return merged
+
+    def _append_vectors(self, vecs: np.ndarray):
+        """Copy .vecs plus `vecs` to a new file (renamed over the old one); returns its memory map."""
+        full = self.full_vectors
+        if full is None or full.shape[0] != self.index.ntotal:
+            print("[faiss] warning: .vecs out of sync with the index; re-ranking off until the next rebuild")
+            return None
+        path = self._vecs_path()
+
+        def _write(tmp):
+            with open(tmp, "wb") as f:
+                for start in range(0, full.shape[0], 65536):
+                    f.write(np.ascontiguousarray(full[start:start + 65536]).tobytes())
+                f.write(np.ascontiguousarray(vecs, dtype="float32").tobytes())
+
+        _atomic_write(path, _write)
+        return _open_vectors(path, self.dim)
+
+    def maybe_compact(self):
+        """Compact when the delta segment is past the size or age threshold."""
+        n = len(self.delta_ids)
+        if n == 0:
+            return 0
+        age = time.time() - (self._delta_since or time.time())
+        if n >= settings.FAISS_DELTA_MAX_VECTORS or age >= settings.FAISS_COMPACT_INTERVAL_SECONDS:
+            return self.compact()
+        return 0
 
     def build_from_db(self, limit=None):
+        """
+        Rebuild this object in place from db.embeddings.
+        For the live, shared index use IndexManager.rebuild(), which builds a new snapshot instead.
+        """
+        with self._lock:
+            return self._build_from_db(limit=limit)
+
+    def _build_from_db(self, limit=None):
+        """
+        Stream db.embeddings into a fresh index in cursor batches.
+        Flat indexes are filled in place (the index's own code buffer is the preallocated
+        matrix); trained/graph indexes get one add() per batch. Either way peak memory is
+        ~1x the final index plus one batch, instead of a list of rows plus a vstack copy.
+        """
         print("Building FAISS index from MongoDB")
-        self.index = faiss.IndexFlatIP(self.dim)
-        self.doc_ids = []
-        cursor = db.embeddings.find({}, {"normed_embedding": 1, "doc_id": 1})
+        # a full rebuild means the corpus may have changed underneath cached chunks
+        doc_cache.invalidate()
+        started = time.perf_counter()
+        expected = db.embeddings.count_documents({})
+        if limit:
+            expected = min(expected, limit)
+        kind = self._resolve_type(expected) if expected else "flat"
+        n_train = min(expected, settings.FAISS_TRAIN_SAMPLE)
+        index = make_index(kind, self.dim, ntotal=expected, n_train=n_train)
+        self._reset_main_postings()
+        self.index = index
+        self.index_kind = kind
+        self._mmapped = False
+        self.tombstones = np.zeros(0, dtype="int64")
+        if not index.is_trained:
+            self.train()
+
+        matrix = None
+        if kind == "flat" and expected:
+            index.codes.resize(expected * self.dim * 4)
+            matrix = faiss.rev_swig_ptr(index.codes.data(), expected * self.dim * 4) \
+                .view("float32").reshape(expected, self.dim)
+
+        # quantized types keep the full-precision rows on disk for re-ranking, streamed out per batch
+        vec_tmp = f"{self._vecs_path()}.tmp-{os.getpid()}"
+        vec_file = open(vec_tmp, "wb") if kind in QUANTIZED_TYPES else None
+
+        doc_ids = []
+        watermark = None
+        filled = 0
+        cursor = db.embeddings.find({}, EMBEDDING_PROJECTION).batch_size(settings.FAISS_BUILD_BATCH)
         if limit:
             cursor = cursor.limit(limit)
-        vecs = []
-        for e in cursor:
-            vec = e.get("normed_embedding") or e.get("embedding")
-            if not vec:
-                continue
-            try:
-                arr = np.array(vec, dtype="float32")
-                # ensure 1D
-                arr = arr.reshape(-1)
-                # normalize for cosine (IndexFlatIP expects normalized vectors)
-                norm = np.linalg.norm(arr)
-                if norm != 0:
-                    arr = arr / norm
-                vecs.append(arr)
-                self.doc_ids.append(str(e.get("doc_id") or e.get("_id")))
-            except Exception as ex:
-                print("[faiss] skipped embedding due to parse error:", ex)
+        for rows in _batched(cursor, settings.FAISS_BUILD_BATCH):
+            key = max(_watermark_key(e) for e in rows)
+            if watermark is None or key > watermark:
+                watermark = key
+            mat, keep = _vectors_from_rows(rows, self.dim)
+            if not keep:
                 continue
+            doc_ids.extend(str(rows[i].get("doc_id") or rows[i].get("_id")) for i in keep)
+            n = mat.shape[0]
+            if vec_file is not None:
+                vec_file.write(mat.tobytes())
+            if matrix is not None and filled + n <= expected:
+                matrix[filled:filled + n] = mat
+                filled += n
+                index.ntotal = filled
+            else:
+                # non-flat index, or rows inserted after the count: regular append
+                # (add() may reallocate the code buffer, so stop writing through the view)
+                index.add(mat)
+                matrix = None
+        if matrix is not None and filled < expected:
+            # skipped rows: shrink the code buffer to what was written
+            index.codes.resize(filled * self.dim * 4)
+        self.doc_ids = doc_ids
+        self.watermark = watermark
+        self.full_vectors = None
+        if vec_file is not None:
+            vec_file.close()
+            if not index.ntotal:
+                os.remove(vec_tmp)
 
-        if len(vecs) == 0:
+        ntotal = index.ntotal
+        elapsed = time.perf_counter() - started
+        if ntotal == 0:
             print("[faiss] no vectors found to build index.")
-            return
+            self.index = faiss.IndexFlatIP(self.dim)
+            self.index_kind = "flat"
+            self._reset_delta()
+            return 0
 
-        mat = np.vstack(vecs).astype("float32")
-        self.index.add(mat)
-        self.save()
+        rate = ntotal / elapsed if elapsed > 0 else float("inf")
+        print(f"[faiss] built {kind} index with {ntotal} vectors in {elapsed:.2f}s ({rate:,.0f} vectors/sec)")
+        with index_files_lock():
+            if vec_file is not None:
+                os.replace(vec_tmp, self._vecs_path())
+                self.full_vectors = _open_vectors(self._vecs_path(), self.dim)
+            self._write_files(self.index, self.doc_ids)
+            # drop the build buffers: serve from the files just written, as load() would
+            if settings.FAISS_MMAP:
+                self._open_main()
+            else:
+                self.doc_ids = DocIdMap(encode_id_map(self.doc_ids))
+        notify_corpus_changed()
+        # the rebuild read every embedding, so pending deltas are already included
+        self._reset_delta()
+        return ntotal
+
+    def _idx_path(self):
+        return settings.FAISS_INDEX_PATH + ".idx"
+
+    def _ids_path(self):
+        return settings.FAISS_INDEX_PATH + ".ids.npy"
+
+    def _vecs_path(self):
+        return settings.FAISS_INDEX_PATH + ".vecs"
 
     def save(self):
-        # write index and meta
-        faiss.write_index(self.index, settings.FAISS_INDEX_PATH + ".idx")
-        with open(settings.FAISS_INDEX_PATH + ".meta", "w", encoding="utf-8") as f:
-            f.write("\n".join(self.doc_ids))
+        with index_files_lock():
+            self._write_files(self.index, self.doc_ids)
+
+    def _write_files(self, index, doc_ids):
+        # write index, binary id map and conf (temp + rename); caller holds index_files_lock()
+        _atomic_write(self._idx_path(), lambda tmp: faiss.write_index(index, tmp))
+
+        id_arr = encode_id_map(doc_ids)
+
+        def _write_ids(tmp):
+            with open(tmp, "wb") as f:
+                np.save(f, id_arr)
+
+        _atomic_write(self._ids_path(), _write_ids)
+        self._write_conf()
+        # the text id map is superseded by .ids.npy
+        try:
+            os.remove(settings.FAISS_INDEX_PATH + ".meta")
+        except FileNotFoundError:
+            pass
+
+    def publish_snapshot(self):
+        """
+        Upload the on-disk index files to GridFS (FAISS_SNAPSHOT_GRIDFS); never raises.
+        Called after rebuilds and on the FAISS_SNAPSHOT_INTERVAL_MINUTES timer, not on every save.
+        Only the publisher process uploads (index_lock.is_snapshot_publisher), and no lock is
+        held during the upload: the file set is hard-linked under a shared file lock and
+        uploaded from the links. Skipped when the files haven't changed since the last upload.
+        Returns the GridFS file id, or None.
+        """
+        global _published_files
+        if not settings.FAISS_SNAPSHOT_GRIDFS or not is_snapshot_publisher():
+            return None
+        if not _publish_lock.acquire(blocking=False):
+            return None
+        base = settings.FAISS_INDEX_PATH
+        stage = f"{base}.publish-{os.getpid()}"
+        linked = []
+        try:
+            with index_files_lock(shared=True):
+                for suffix in snapshot_store.SNAPSHOT_SUFFIXES:
+                    if os.path.exists(base + suffix):
+                        if os.path.exists(stage + suffix):
+                            os.remove(stage + suffix)
+                        os.link(base + suffix, stage + suffix)
+                        linked.append(stage + suffix)
+            # every write replaces files by rename, so changed content means new inodes
+            files = tuple(sorted((p, os.stat(p).st_ino) for p in linked))
+            if stage + ".idx" not in linked or files == _published_files:
+                return None
+            conf = {}
+            if os.path.exists(stage + ".conf"):
+                with open(stage + ".conf", "r", encoding="utf-8") as f:
+                    conf = json.load(f)
+            wm = conf.get("watermark")
+            watermark = (datetime.datetime.fromisoformat(wm["created_at"]), wm["_id"]) if wm else None
+            ntotal = 0
+            if os.path.exists(stage + ".ids.npy"):
+                ntotal = np.load(stage + ".ids.npy", mmap_mode="r").shape[0] - len(conf.get("tombstones") or [])
+            file_id = snapshot_store.upload_snapshot(
+                stage, self.dim, generation=int(conf.get("generation", 0)), watermark=watermark,
+                ntotal=ntotal, filename=os.path.basename(base),
+            )
+            _published_files = files
+            return file_id
+        except Exception as e:
+            print("[faiss] warning: snapshot upload failed:", e)
+            return None
+        finally:
+            for path in linked:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            _publish_lock.release()
+
+    def save_conf(self):
+        """Write .conf (index type, generation, refresh watermark, tombstones)."""
+        with index_files_lock():
+            self._write_conf()
+
+    def _write_conf(self):
+        wm = None
+        if self.watermark is not None:
+            created_at, last_id = self.watermark
+            wm = {"created_at": created_at.isoformat(), "_id": str(last_id)}
+        conf = {
+            "index_type": self.index_type,
+            "index_kind": self.index_kind,
+            "dim": self.dim,
+            "generation": self.generation,
+            "watermark": wm,
+            "tombstones": self.tombstones.tolist(),
+        }
+
+        def _write_conf(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(conf, f)
+
+        _atomic_write(settings.FAISS_INDEX_PATH + ".conf", _write_conf)
+
+    def _open_main(self):
+        """Read the main index and id map, memory-mapped when FAISS_MMAP is on."""
+        idx_path = self._idx_path()
+        mmapped = False
+        if settings.FAISS_MMAP:
+            try:
+                index = faiss.read_index(idx_path, _mmap_flag())
+                mmapped = True
+            except Exception as e:
+                print("[faiss] mmap load failed, reading index into memory:", e)
+                index = faiss.read_index(idx_path)
+        else:
+            index = faiss.read_index(idx_path)
+
+        if os.path.exists(self._ids_path()):
+            arr = np.load(self._ids_path(), mmap_mode="r" if settings.FAISS_MMAP else None)
+            doc_ids = DocIdMap(arr)
+        else:
+            # legacy text id map: one id per line
+            with open(settings.FAISS_INDEX_PATH + ".meta", "r", encoding="utf-8") as f:
+                doc_ids = [l.strip() for l in f if l.strip()]
+        full_vectors = None
+        if _kind_of(index) in QUANTIZED_TYPES:
+            if os.path.exists(self._vecs_path()):
+                full_vectors = _open_vectors(self._vecs_path(), self.dim)
+            if full_vectors is None or full_vectors.shape[0] != index.ntotal:
+                print("[faiss] warning: no matching .vecs for the quantized index; searching codes only")
+                full_vectors = None
+        self.full_vectors = full_vectors
+        self.doc_ids = doc_ids
+        self.index = index
+        self._mmapped = mmapped
 
     def load(self):
-        idx_path = settings.FAISS_INDEX_PATH + ".idx"
+        idx_path = self._idx_path()
         meta_path = settings.FAISS_INDEX_PATH + ".meta"
-        if not os.path.exists(idx_path) or not os.path.exists(meta_path):
-            # nothing to load
-            return
+        conf_path = settings.FAISS_INDEX_PATH + ".conf"
+
+        def _have_files():
+            return os.path.exists(idx_path) and (os.path.exists(self._ids_path()) or os.path.exists(meta_path))
+
+        if not _have_files():
+            # local files are gone (e.g. a wiped disk on redeploy): fetch the newest saved snapshot;
+            # the caller's refresh() then indexes only what was written after its watermark
+            if not settings.FAISS_SNAPSHOT_GRIDFS:
+                return
+            try:
+                with index_files_lock():
+                    # another worker may have restored (or rebuilt) it while this one waited
+                    if not _have_files() and snapshot_store.download_latest(settings.FAISS_INDEX_PATH, self.dim) is None:
+                        return
+            except Exception as e:
+                print("[faiss] warning: snapshot download failed:", e)
+                return
         try:
-            self.index = faiss.read_index(idx_path)
-            with open(meta_path, "r", encoding="utf-8") as f:
-                self.doc_ids = [l.strip() for l in f if l.strip()]
+            self._reset_main_postings()
+            with index_files_lock(shared=True):
+                self._open_main()
+                conf = {}
+                if os.path.exists(conf_path):
+                    with open(conf_path, "r", encoding="utf-8") as f:
+                        conf = json.load(f)
+            self.index_kind = conf.get("index_kind") or _kind_of(self.index)
+            if not self._type_pinned and conf.get("index_type"):
+                self.index_type = conf["index_type"]
+            self.generation = int(conf.get("generation", 0))
+            wm = conf.get("watermark")
+            if wm:
+                from bson.objectid import ObjectId
+                last_id = ObjectId(wm["_id"]) if _is_object_id(wm["_id"]) else wm["_id"]
+                self.watermark = (datetime.datetime.fromisoformat(wm["created_at"]), last_id)
+            self.tombstones = np.asarray(conf.get("tombstones") or [], dtype="int64")
+            self._replay_delta_log()
         except Exception as e:
             print("[faiss] Failed to load index:", e)
 
-    def search(self, normed_vectors: np.ndarray, top_k=5):
-        if self.index is None or getattr(self.index, "ntotal", 0) == 0:
-            return []
-        D, I = self.index.search(normed_vectors, top_k)
+    def _load_doc_meta(self, doc_ids) -> list:
+        """Filterable metadata (source/url/tags) aligned with doc_ids, via batched $in queries."""
+        from bson.objectid import ObjectId
+        doc_ids = list(doc_ids)
+        found = {}
+        for start in range(0, len(doc_ids), 5000):
+            keys = []
+            for d in doc_ids[start:start + 5000]:
+                try:
+                    keys.append(ObjectId(d))
+                except Exception:
+                    keys.append(d)
+            for doc in db.knowledge_documents.find({"_id": {"$in": keys}}, {"source": 1, "url": 1, "tags": 1}):
+                found[str(doc["_id"])] = doc
+        return [found.get(d) for d in doc_ids]
+
+    def ensure_postings(self):
+        """
+        Build the main postings (once per main segment) and extend the delta postings to the
+        current delta; returns (main, delta) postings. The Mongo reads run outside the writer
+        lock, and results are installed only if their segment is still the live one.
+        IndexManager calls this in its load/rebuild jobs (FAISS_PREBUILD_POSTINGS), so queries
+        normally find the main postings ready.
+        """
+        with self._postings_lock:
+            version, main = self._main_version, self._postings
+            doc_ids = self.doc_ids
+            if self._delta_postings is None:
+                self._delta_postings, self._delta_postings_n = Postings(), 0
+            delta, covered = self._delta_postings, self._delta_postings_n
+            delta_ids = self.delta_ids
+        if main is None:
+            with self._postings_build_lock:
+                with self._postings_lock:
+                    if self._main_version == version:
+                        main = self._postings
+                if main is None:
+                    main = Postings.build(self._load_doc_meta(doc_ids))
+                    print(f"[faiss] built filter postings over {len(doc_ids)} vectors ({len(main)} keys)")
+                    with self._postings_lock:
+                        if self._postings is None and self._main_version == version:
+                            self._postings = main
+        metas = self._load_doc_meta(delta_ids[covered:]) if len(delta_ids) > covered else []
+        with self._postings_lock:
+            if metas and self._delta_postings is delta and self._delta_postings_n == covered:
+                for offset, meta in enumerate(metas):
+                    delta.add(covered + offset, meta)
+                self._delta_postings_n = covered + len(metas)
+        return main, delta
+
+    @staticmethod
+    def _selector(positions: np.ndarray, ntotal: int):
+        # dense filters use a bitmap, sparse ones a hash set; callers keep the arrays alive
+        if positions.size * 16 > ntotal:
+            mask = np.zeros(ntotal, dtype=bool)
+            mask[positions] = True
+            bitmap = np.packbits(mask, bitorder="little")
+            return faiss.IDSelectorBitmap(ntotal, faiss.swig_ptr(bitmap)), bitmap
+        return faiss.IDSelectorBatch(positions), positions
+
+    def _search_params(self, nprobe=None, ef_search=None, sel=None):
+        if self.index_kind in ("ivf_flat", "ivf_pq"):
+            params = faiss.SearchParametersIVF(nprobe=int(nprobe or settings.FAISS_NPROBE))
+        elif self.index_kind == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=int(ef_search or settings.FAISS_EF_SEARCH))
+        elif sel is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        if sel is not None:
+            params.sel = sel
+        return params
+
+    def _search_main(self, index, normed_vectors, top_k, nprobe=None, ef_search=None, positions=None,
+                     excluded=None, full_vectors=None):
+        """
+        Search the main index, restricted to `positions` (sorted int64) when given,
+        and skipping `excluded` positions (tombstones) otherwise.
+        Quantized types with `full_vectors` search top_k * FAISS_RERANK_FACTOR codes,
+        then re-rank those candidates exactly.
+        """
+        factor = settings.FAISS_RERANK_FACTOR
+        if full_vectors is None or factor <= 1 or self.index_kind not in QUANTIZED_TYPES:
+            return self._search_codes(index, normed_vectors, top_k, nprobe, ef_search, positions, excluded)
+        k1 = min(top_k * factor, index.ntotal)
+        _, I = self._search_codes(index, normed_vectors, k1, nprobe, ef_search, positions, excluded)
+        return _rerank(normed_vectors, I, full_vectors, top_k)
+
+    def _search_codes(self, index, normed_vectors, top_k, nprobe=None, ef_search=None, positions=None, excluded=None):
+        if positions is None and excluded is not None and excluded.size:
+            # keep a reference to the inner selector for the duration of the search
+            inner = faiss.IDSelectorBatch(excluded)
+            sel = faiss.IDSelectorNot(inner)
+            params = self._search_params(nprobe=nprobe, ef_search=ef_search, sel=sel)
+            return index.search(normed_vectors, top_k, params=params)
+        if positions is None:
+            params = self._search_params(nprobe=nprobe, ef_search=ef_search)
+            if params is not None:
+                return index.search(normed_vectors, top_k, params=params)
+            return index.search(normed_vectors, top_k)
+
+        ntotal = index.ntotal
+        sel, _keepalive = self._selector(positions, ntotal)
+        params = self._search_params(nprobe=nprobe, ef_search=ef_search, sel=sel)
+        D, I = index.search(normed_vectors, top_k, params=params)
+        want = min(top_k, positions.size)
+        if (I >= 0).sum(axis=1).min() >= want or self.index_kind in _EXHAUSTIVE_TYPES:
+            return D, I
+        # approximate indexes can come up short on selective filters; fall back to an exact pass
+        if self.index_kind in ("ivf_flat", "ivf_pq"):
+            params.nprobe = faiss.extract_index_ivf(index).nlist
+            return index.search(normed_vectors, top_k, params=params)
+        vecs = index.reconstruct_batch(positions)
+        scores = normed_vectors @ vecs.T
+        order = np.argsort(-scores, axis=1)[:, :top_k]
+        D = np.full((normed_vectors.shape[0], top_k), -np.inf, dtype="float32")
+        I = np.full((normed_vectors.shape[0], top_k), -1, dtype="int64")
+        D[:, :order.shape[1]] = np.take_along_axis(scores, order, axis=1)
+        I[:, :order.shape[1]] = positions[order]
+        return D, I
+
+    def search(self, normed_vectors: np.ndarray, top_k=5, nprobe=None, ef_search=None, filters=None):
+        """
+        nprobe: IVF lists to visit for this query (IVF types only)
+        ef_search: HNSW candidate list size for this query (HNSW only)
+        filters: metadata filter, e.g. {"source": "seed", "concept": ["bfs", "dfs"]}
+        Returns the hits of all query rows as one flat list.
+        """
         results = []
-        for dist_list, idx_list in zip(D, I):
-            for dist, idx in zip(dist_list, idx_list):
-                if idx < 0 or idx >= len(self.doc_ids):
+        for row in self.search_batch(normed_vectors, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filters=filters):
+            results.extend(row)
+        return results
+
+    def search_batch(self, normed_vectors: np.ndarray, top_k=5, nprobe=None, ef_search=None, filters=None):
+        """
+        Search a matrix of query vectors in one FAISS call.
+        Returns one hit list per query row; results from the main index and the
+        delta segment are merged by score. With filters, only matching vectors are
+        considered (via IDSelector over the metadata postings).
+        """
+        normed_vectors = np.ascontiguousarray(normed_vectors, dtype="float32").reshape(-1, self.dim)
+        if self.ntotal == 0:
+            return [[] for _ in range(normed_vectors.shape[0])]
+        # read each segment once (index before ids; see compact()) so a concurrent swap can't mix them
+        index = self.index
+        doc_ids = self.doc_ids
+        delta_index, delta_ids = self._delta
+        tombstones = self.tombstones
+        full_vectors = self.full_vectors
+        main_pos = delta_pos = None
+        filters = normalize_filters(filters)
+        if filters:
+            main_postings, delta_postings = self.ensure_postings()
+            main_pos = main_postings.select(filters)
+            main_pos = main_pos[main_pos < getattr(index, "ntotal", 0)]
+            if tombstones.size:
+                main_pos = np.setdiff1d(main_pos, tombstones, assume_unique=True)
+            delta_pos = delta_postings.select(filters)
+            # postings may be one delta append behind; never select past this snapshot
+            delta_pos = delta_pos[delta_pos < delta_index.ntotal]
+        hits = [[] for _ in range(normed_vectors.shape[0])]
+        if index is not None and index.ntotal > 0 and (main_pos is None or main_pos.size > 0):
+            D, I = self._search_main(index, normed_vectors, top_k, nprobe=nprobe, ef_search=ef_search,
+                                     positions=main_pos, excluded=tombstones, full_vectors=full_vectors)
+            for row, (dist_list, idx_list) in enumerate(zip(D, I)):
+                for dist, idx in zip(dist_list, idx_list):
+                    if idx < 0 or idx >= len(doc_ids):
+                        continue
+                    hits[row].append((float(dist), doc_ids[idx]))
+        if delta_index.ntotal > 0 and (delta_pos is None or delta_pos.size > 0):
+            if delta_pos is None:
+                D, I = delta_index.search(normed_vectors, min(top_k, delta_index.ntotal))
+            else:
+                sel = faiss.IDSelectorBatch(delta_pos)
+                D, I = delta_index.search(normed_vectors, min(top_k, delta_pos.size),
+                                          params=faiss.SearchParameters(sel=sel))
+            for row, (dist_list, idx_list) in enumerate(zip(D, I)):
+                for dist, idx in zip(dist_list, idx_list):
+                    if idx < 0 or idx >= len(delta_ids):
+                        continue
+                    hits[row].append((float(dist), delta_ids[idx]))
+        results = []
+        for row_hits in hits:
+            row_hits.sort(key=lambda h: -h[0])
+            row, seen = [], set()
+            for dist, doc_id in row_hits:
+                # a concurrent compaction can briefly expose a vector in both segments
+                if doc_id in seen:
                     continue
-                results.append({"doc_id": self.doc_ids[idx], "score": float(dist)})
+                seen.add(doc_id)
+                row.append({"doc_id": doc_id, "score": dist})
+                if len(row) >= top_k:
+                    break
+            results.append(row)
         return results
+
+    # --- incremental refresh helpers (driven by IndexManager.refresh) ---
+
+    def _main_id_view(self) -> SortedIds:
+        """Sorted view of the live main-segment ids, built once per id map / tombstone set."""
+        doc_ids, tombstones = self.doc_ids, self.tombstones
+        view = self._main_view
+        if view is None or view[0] is not doc_ids or view[1] is not tombstones:
+            view = (doc_ids, tombstones, SortedIds(doc_ids, exclude=tombstones))
+            self._main_view = view
+        return view[2]
+
+    def contains(self, doc_ids) -> np.ndarray:
+        """
+        Mask of which doc_ids are already indexed (main or delta segment, tombstoned ones excluded).
+        Main ids are binary-searched in a sorted view, so a call costs O(len(doc_ids) log N);
+        the small delta is scanned directly.
+        """
+        doc_ids = [str(d) for d in doc_ids]
+        if not doc_ids:
+            return np.zeros(0, dtype=bool)
+        found = self._main_id_view().contains(doc_ids)
+        if self.delta_ids:
+            found |= id_membership(self.delta_ids, doc_ids)
+        return found
+
+    def iter_new_embeddings(self, batch_size: int = 1000, overlap_seconds: int = None):
+        """
+        Yield (normed matrix, doc_ids, watermark) batches for db.embeddings rows
+        newer than self.watermark, in watermark order.
+        overlap_seconds (default INDEX_REFRESH_OVERLAP_SECONDS): also re-read rows stamped up to
+        this long before the watermark, which a writer may have committed late; callers skip
+        the ones already indexed (contains()).
+        """
+        if overlap_seconds is None:
+            overlap_seconds = settings.INDEX_REFRESH_OVERLAP_SECONDS
+        query = {}
+        if self.watermark is not None:
+            created_at, last_id = self.watermark
+            overlap = datetime.timedelta(seconds=max(overlap_seconds, 0))
+            # (a datetime.min watermark means only rows without created_at were indexed so far)
+            if overlap and created_at - datetime.datetime.min > overlap:
+                query = {"created_at": {"$gte": created_at - overlap}}
+            else:
+                query = {"$or": [
+                    {"created_at": {"$gt": created_at}},
+                    {"created_at": created_at, "_id": {"$gt": last_id}},
+                ]}
+        cursor = db.embeddings.find(query, EMBEDDING_PROJECTION) \
+            .sort([("created_at", 1), ("_id", 1)]).batch_size(batch_size)
+        wm = self.watermark
+        yielded = False
+        for rows in _batched(cursor, batch_size):
+            wm = max(wm, _watermark_key(rows[-1])) if wm is not None else _watermark_key(rows[-1])
+            mat, keep = _vectors_from_rows(rows, self.dim)
+            yielded = True
+            yield mat, [str(rows[i].get("doc_id") or rows[i].get("_id")) for i in keep], wm
+        if not yielded and wm != self.watermark:
+            yield np.zeros((0, self.dim), dtype="float32"), [], wm
+
+    def stale_doc_ids(self, live_doc_ids) -> list:
+        """Indexed main-segment doc ids that are no longer in live_doc_ids (and not yet tombstoned)."""
+        doc_ids = self.doc_ids
+        if len(doc_ids) == 0:
+            return []
+        positions = np.flatnonzero(~id_membership(live_doc_ids, doc_ids))
+        positions = np.setdiff1d(positions, self.tombstones, assume_unique=True)
+        return [doc_ids[int(p)] for p in positions]
+
+    def without_doc_ids(self, doc_ids) -> "FaissIndex":
+        """
+        Return a new snapshot with the given main-segment doc ids removed.
+        Flat/sq8 indexes drop them with remove_ids (order preserving, so the id map and
+        .vecs shrink the same way); other types record tombstones until the next full rebuild.
+        """
+        all_ids = self.doc_ids
+        mask = id_membership([str(d) for d in doc_ids], all_ids) if len(all_ids) else np.zeros(0, dtype=bool)
+        positions = np.flatnonzero(mask).astype("int64")
+
+        snap = FaissIndex(self.dim, index_type=self.index_type)
+        snap._type_pinned = self._type_pinned
+        snap.index_kind = self.index_kind
+        snap.generation = self.generation
+        snap.watermark = self.watermark
+        snap._delta = self._delta
+        snap._delta_since = self._delta_since
+        # postings follow the segments (the delta's are shared; it is the same segment)
+        with self._postings_lock:
+            main_postings = self._postings
+            snap._delta_postings, snap._delta_postings_n = self._delta_postings, self._delta_postings_n
+        snap._postings = main_postings
+        snap.full_vectors = self.full_vectors
+        if positions.size == 0:
+            snap.index, snap.doc_ids, snap._mmapped = self.index, self.doc_ids, self._mmapped
+            snap.tombstones = self.tombstones
+            return snap
+
+        if self.index_kind in _EXHAUSTIVE_TYPES:
+            new_index = _private_copy(self.index, self._mmapped)
+            new_index.remove_ids(faiss.IDSelectorBatch(positions))
+            keep = np.ones(len(all_ids), dtype=bool)
+            keep[positions] = False
+            if isinstance(all_ids, DocIdMap):
+                new_ids = DocIdMap(np.asarray(all_ids.array)[keep])
+            else:
+                new_ids = [d for d, k in zip(all_ids, keep) if k]
+            if new_index.ntotal != len(new_ids):
+                raise RuntimeError(f"removal would write {new_index.ntotal} vectors with {len(new_ids)} doc ids")
+            snap.index, snap.doc_ids = new_index, new_ids
+            snap.tombstones = np.zeros(0, dtype="int64")
+            snap._postings = main_postings.remapped(keep) if main_postings is not None else None
+            with index_files_lock():
+                snap.full_vectors = self._write_kept_vectors(keep)
+                snap._write_files(new_index, new_ids)
+                if settings.FAISS_MMAP:
+                    snap._open_main()
+        else:
+            snap.index, snap.doc_ids, snap._mmapped = self.index, self.doc_ids, self._mmapped
+            snap.tombstones = np.union1d(self.tombstones, positions).astype("int64")
+            snap.save_conf()
+        print(f"[faiss] removed {positions.size} deleted docs from the index")
+        return snap
+
+    def _write_kept_vectors(self, keep: np.ndarray):
+        """Rewrite .vecs without the rows where `keep` is False; returns the new map (None if no .vecs)."""
+        full = self.full_vectors
+        if full is None or full.shape[0] != keep.size:
+            return None
+
+        def _write(tmp):
+            with open(tmp, "wb") as f:
+                for start in range(0, keep.size, 65536):
+                    rows = full[start:start + 65536][keep[start:start + 65536]]
+                    f.write(np.ascontiguousarray(rows, dtype="float32").tobytes())
+
+        _atomic_write(self._vecs_path(), _write)
+        return _open_vectors(self._vecs_path(), self.dim)
@@ -0,0 +1,42 @@
+# backend/app/retriever/index_lock.py
+"""
+Cross-process lock over the on-disk FAISS file set (FAISS_INDEX_PATH + .idx, .ids.npy, .vecs, .conf).
+Web workers share one index directory and each may compact or rebuild its own copy, so a
+whole file set is written under an exclusive flock and read under a shared one; a reader
+never pairs one worker's .idx with another worker's .ids.npy.
+flock is per open file, so the lock is not re-entrant: take it once around the whole write.
+GridFS snapshots are uploaded by a single publisher process (is_snapshot_publisher()).
+"""
+import contextlib
+import fcntl
+import os
+from ..core.config import settings
+
+@contextlib.contextmanager
+def index_files_lock(shared: bool = False):
+    with open(settings.FAISS_INDEX_PATH + ".lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+_publisher_fd = None
+
+def is_snapshot_publisher() -> bool:
+    """
+    True in the one process that uploads GridFS snapshots: the first to take a non-blocking
+    flock on FAISS_INDEX_PATH + ".publisher" holds it for its lifetime, and another process
+    takes over on its next attempt once that one exits.
+    """
+    global _publisher_fd
+    if _publisher_fd is not None:
+        return True
+    fd = os.open(settings.FAISS_INDEX_PATH + ".publisher", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    _publisher_fd = fd
+    return True
@@ -0,0 +1,188 @@
+# backend/app/retriever/index_manager.py
+"""
+Versioned owner of the live FAISS index.
+- readers take `manager.current` (a plain attribute read) and search it without locks
+- every write (ingest adds, compaction, rebuilds) runs on one single-threaded
+  executor, so there is exactly one writer per process
+- rebuilds go into a brand-new FaissIndex generation, written to disk atomically
+  (temp + rename), then swapped in with one pointer assignment
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from ..core.config import settings
+from ..db.mongo import db
+import numpy as np
+from .faiss_index import FaissIndex, id_membership, first_occurrences, notify_corpus_changed
+
+class IndexManager:
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.current = FaissIndex(dim)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faiss-writer")
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_future = None
+        # False until the first snapshot is installed (the one loaded from disk at startup)
+        self._installed = False
+
+    @property
+    def generation(self) -> int:
+        return self.current.generation
+
+    def _swap(self, new_index: FaissIndex):
+        # generations only move forward, across restarts too: the first snapshot keeps the
+        # generation loaded from its .conf, later ones go past both it and the live one
+        floor = self.current.generation + 1 if self._installed else 0
+        new_index.generation = max(new_index.generation, floor)
+        self._installed = True
+        new_index.save_conf()
+        # single pointer flip; in-flight searches finish on the old snapshot
+        self.current = new_index
+        print(f"[index_manager] generation {new_index.generation} live (ntotal={new_index.ntotal})")
+
+    @staticmethod
+    def _prepare(idx: FaissIndex):
+        # read the filter postings here, on the writer, rather than in the first filtered query
+        if not settings.FAISS_PREBUILD_POSTINGS or idx.ntotal == 0:
+            return
+        try:
+            idx.ensure_postings()
+        except Exception as e:
+            print("[index_manager] warning: failed to build filter postings:", e)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Run a write job on the single writer thread."""
+        return self._writer.submit(fn, *args, **kwargs)
+
+    def load(self, wait: bool = True):
+        """Load the on-disk index into a new snapshot."""
+        def _job():
+            idx = FaissIndex(self.dim)
+            idx.load()
+            self._prepare(idx)
+            self._swap(idx)
+            return idx.ntotal
+        fut = self.submit(_job)
+        return fut.result() if wait else fut
+
+    def rebuild(self, index_type: str = None, wait: bool = False):
+        """
+        Build a new generation from MongoDB in the background and swap it in.
+        Concurrent callers share the rebuild already queued or running.
+        """
+        with self._rebuild_lock:
+            fut = self._rebuild_future
+            if fut is None or fut.done():
+                fut = self.submit(self._rebuild_job, index_type)
+                self._rebuild_future = fut
+        return fut.result() if wait else fut
+
+    def _rebuild_job(self, index_type: str = None):
+        idx = FaissIndex(self.dim, index_type=index_type or self.current.index_type)
+        # set before the build so the files it saves carry the new generation
+        idx.generation = self.current.generation + 1
+        count = idx.build_from_db()
+        self._prepare(idx)
+        self._swap(idx)
+        if count:
+            self.publish_snapshot()
+        return count
+
+    def refresh(self, detect_deletions: bool = False, wait: bool = False):
+        """
+        Incremental refresh: index db.embeddings rows newer than the snapshot's
+        (created_at, _id) watermark and, optionally, drop doc_ids that no longer exist.
+        Rows up to INDEX_REFRESH_OVERLAP_SECONDS older than the watermark are read again, so a
+        row committed after a refresh passed its created_at is still picked up.
+        Cost is O(new rows + overlap window) Mongo reads plus an O(log N) id lookup per row
+        (FaissIndex.contains; its sorted id view is built once per main segment), plus one
+        id-only scan when detect_deletions is on.
+        """
+        fut = self.submit(self._refresh_job, detect_deletions)
+        return fut.result() if wait else fut
+
+    def _refresh_job(self, detect_deletions: bool = False):
+        idx = self.current
+        if idx.ntotal == 0 or idx.watermark is None:
+            # nothing to increment from (fresh deployment or pre-watermark index)
+            return {"added": self._rebuild_job(), "removed": 0, "full_rebuild": True}
+
+        added = 0
+        for mat, doc_ids, watermark in idx.iter_new_embeddings(settings.INDEX_REFRESH_BATCH):
+            if doc_ids:
+                # rows ingested through add() are already in the index
+                new = first_occurrences(doc_ids, ~idx.contains(doc_ids))
+                if new.any():
+                    idx.add(mat[new], [d for d, keep in zip(doc_ids, new) if keep])
+                    added += int(new.sum())
+            idx.watermark = watermark
+
+        removed = 0
+        if detect_deletions:
+            live = [str(e["doc_id"]) for e in db.embeddings.find({}, {"doc_id": 1, "_id": 0}) if e.get("doc_id")]
+            if idx.delta_ids and not id_membership(live, idx.delta_ids).all():
+                # fold the delta in so deletions only ever touch the main segment
+                idx.compact()
+            gone = idx.stale_doc_ids(live)
+            if gone:
+                snap = idx.without_doc_ids(gone)
+                removed = len(gone)
+                if snap.tombstones.size > 0.1 * max(snap.index.ntotal, 1):
+                    # too many tombstones for an approximate index; start a fresh generation
+                    self._swap(snap)
+                    return {"added": added, "removed": removed, "full_rebuild": bool(self._rebuild_job())}
+                self._swap(snap)
+                idx = snap
+
+        idx.save_conf()
+        if len(idx.delta_ids) >= settings.FAISS_DELTA_MAX_VECTORS:
+            idx.compact()
+        if added or removed:
+            notify_corpus_changed()
+            print(f"[index_manager] refresh: +{added} / -{removed} vectors")
+        return {"added": added, "removed": removed, "full_rebuild": False}
+
+    def add(self, normed_vectors, doc_ids, wait: bool = True):
+        """
+        Append vectors to the live snapshot (delta segment) via the writer; doc ids already
+        indexed are skipped, so this is idempotent. Returns how many were added.
+        """
+        def _job():
+            idx = self.current
+            ids = [str(d) for d in doc_ids]
+            # a refresh or rebuild between ingest's insert and this call may have indexed them already
+            keep = first_occurrences(ids, ~idx.contains(ids))
+            if not keep.any():
+                return 0
+            idx.add(np.asarray(normed_vectors, dtype="float32").reshape(len(ids), -1)[keep],
+                    [d for d, k in zip(ids, keep) if k])
+            # fold the delta in once it passes the size threshold
+            if len(idx.delta_ids) >= settings.FAISS_DELTA_MAX_VECTORS:
+                idx.compact()
+            return int(keep.sum())
+        fut = self.submit(_job)
+        return fut.result() if wait else fut
+
+    def maybe_compact(self, wait: bool = False):
+        fut = self.submit(lambda: self.current.maybe_compact())
+        return fut.result() if wait else fut
+
+    def compact(self, wait: bool = False):
+        fut = self.submit(lambda: self.current.compact())
+        return fut.result() if wait else fut
+
+    def publish_snapshot(self, wait: bool = False):
+        """Upload the index files to GridFS off the writer thread (see FaissIndex.publish_snapshot)."""
+        idx = self.current
+        if wait:
+            return idx.publish_snapshot()
+        threading.Thread(target=idx.publish_snapshot, name="faiss-publish", daemon=True).start()
+        return None
+
+    def status(self) -> dict:
+        idx = self.current
+        return {
+            "generation": idx.generation,
+            "ntotal": idx.ntotal,
+            "delta_ntotal": idx.delta_index.ntotal,
+            "rebuilding": bool(self._rebuild_future and not self._rebuild_future.done()),
+        }
@@ -0,0 +1,98 @@
+# backend/app/retriever/postings.py
+"""
+In-memory postings for filtered vector search.
+Maps (field, value) -> sorted positions in an index segment, so a metadata filter
+becomes a FAISS IDSelector instead of over-fetching and discarding in Python.
+"""
+import numpy as np
+
+FILTER_FIELDS = ("source", "url", "tags")
+# request-side names accepted for the fields above
+FIELD_ALIASES = {"concept": "tags", "tag": "tags"}
+
+def normalize_filters(filters: dict | None) -> dict:
+    """{"concept": "bfs", "source": ["seed"]} -> {"tags": ["bfs"], "source": ["seed"]}"""
+    out = {}
+    for field, values in (filters or {}).items():
+        field = FIELD_ALIASES.get(field, field)
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"unsupported filter field: {field}")
+        if values is None:
+            continue
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        out.setdefault(field, []).extend(str(v) for v in values)
+    return out
+
+class Postings:
+    def __init__(self):
+        self._lists = {}
+        self._arrays = {}
+
+    @classmethod
+    def build(cls, metas: list) -> "Postings":
+        """metas: per-position metadata dicts (or None for unknown docs)."""
+        p = cls()
+        for pos, meta in enumerate(metas):
+            p.add(pos, meta)
+        return p
+
+    def add(self, pos: int, meta: dict | None):
+        if not meta:
+            return
+        for field in FILTER_FIELDS:
+            values = meta.get(field)
+            if values is None:
+                continue
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            for v in values:
+                key = (field, str(v))
+                self._lists.setdefault(key, []).append(pos)
+                self._arrays.pop(key, None)
+
+    def merged(self, other: "Postings", offset: int) -> "Postings":
+        """New postings with other's positions shifted by offset appended (a delta folded into main)."""
+        p = Postings()
+        p._lists = {key: list(positions) for key, positions in self._lists.items()}
+        for key, positions in other._lists.items():
+            p._lists.setdefault(key, []).extend(pos + offset for pos in positions)
+        return p
+
+    def remapped(self, keep: np.ndarray) -> "Postings":
+        """New postings after the rows where keep is False were removed (positions shift down)."""
+        new_pos = np.cumsum(keep) - 1
+        p = Postings()
+        for key, positions in self._lists.items():
+            arr = np.asarray(positions, dtype="int64")
+            arr = arr[arr < keep.size]
+            arr = new_pos[arr[keep[arr]]]
+            if arr.size:
+                p._lists[key] = arr.tolist()
+        return p
+
+    def _array(self, key) -> np.ndarray:
+        arr = self._arrays.get(key)
+        if arr is None:
+            arr = np.asarray(self._lists.get(key, ()), dtype="int64")
+            self._arrays[key] = arr
+        return arr
+
+    def select(self, filters: dict) -> np.ndarray:
+        """
+        Positions matching normalized filters: values of one field are OR-ed,
+        fields are AND-ed. Returns a sorted int64 array.
+        """
+        result = None
+        for field, values in filters.items():
+            arrays = [self._array((field, v)) for v in values]
+            matched = np.unique(np.concatenate(arrays)) if arrays else np.zeros(0, dtype="int64")
+            result = matched if result is None else np.intersect1d(result, matched, assume_unique=True)
+            if result.size == 0:
+                break
+        if result is None:
+            return np.zeros(0, dtype="int64")
+        return result
+
+    def __len__(self):
+        return len(self._lists)
@@ -1,45 +1,160 @@
 # backend/app/retriever/retriever.py
 from ..embeddings.embedder import embed_texts
-from .faiss_index import FaissIndex
+from .index_manager import IndexManager
+from .doc_cache import doc_cache
+from .batcher import QueryBatcher
+from ..sidecar.client import RemoteIndexManager, sidecar_enabled, call_or_fallback
 from ..db.mongo import db
 import numpy as np
 from ..core.config import settings
 from bson.objectid import ObjectId
+import asyncio
+import threading
 
-# module-level singleton
-_INDEX_SINGLETON = None
+# module-level singletons
+_MANAGER_SINGLETON = None
+_REMOTE_MANAGER = None
+_BATCHER_SINGLETON = None
+# first requests can arrive together; each singleton (and its writer thread) is created once
+_singletons_lock = threading.RLock()
+
+# fields needed by the RAG prompt and the API responses
+DOC_PROJECTION = {"text": 1, "url": 1, "title": 1}
+
+def get_index_manager():
+    """The index manager; a proxy for the sidecar's index when SIDECAR_SOCKET is set."""
+    global _REMOTE_MANAGER
+    if sidecar_enabled():
+        if _REMOTE_MANAGER is None:
+            with _singletons_lock:
+                if _REMOTE_MANAGER is None:
+                    _REMOTE_MANAGER = RemoteIndexManager()
+        return _REMOTE_MANAGER
+    return _local_index_manager()
+
+def _local_index_manager():
+    global _MANAGER_SINGLETON
+    if _MANAGER_SINGLETON is None:
+        with _singletons_lock:
+            if _MANAGER_SINGLETON is None:
+                manager = IndexManager(settings.EMBEDDING_DIM)
+                try:
+                    manager.load()
+                except Exception:
+                    pass
+                # published only once loaded, so the unlocked check never sees an empty manager
+                _MANAGER_SINGLETON = manager
+    return _MANAGER_SINGLETON
 
 def get_index():
-    global _INDEX_SINGLETON
-    if _INDEX_SINGLETON is None:
-        _INDEX_SINGLETON = FaissIndex(settings.EMBEDDING_DIM)
-        try:
-            _INDEX_SINGLETON.load()
-        except Exception:
-            pass
-    return _INDEX_SINGLETON
-
-def top_k_documents(query: str, k=5):
-    embs, normed = embed_texts([query])
-    index = get_index()
-    # if index empty, build from DB (safe)
-    if index is None or getattr(index.index, "ntotal", 0) == 0:
-        index.build_from_db()
-    if getattr(index.index, "ntotal", 0) == 0:
-        return []
-
-    res = index.search(normed, top_k=k)
-    docs = []
-    for r in res:
-        doc_id_str = r.get("doc_id")
-        if not doc_id_str:
-            continue
-        # try to fetch knowledge_documents by converting doc_id_str to ObjectId if possible
-        try:
-            doc = db.knowledge_documents.find_one({"_id": ObjectId(doc_id_str)})
-        except Exception:
-            # fallback: try using string field
-            doc = db.knowledge_documents.find_one({"_id": doc_id_str})
-        if doc:
-            docs.append({"doc": doc, "score": r.get("score")})
-    return docs
+    """Current live snapshot (read-only use; writes go through get_index_manager())."""
+    return get_index_manager().current
+
+def _as_db_id(doc_id_str: str):
+    # ids are normally ObjectId hex strings; older rows may use plain string _ids
+    try:
+        return ObjectId(doc_id_str)
+    except Exception:
+        return doc_id_str
+
+def fetch_documents(doc_ids) -> dict:
+    """
+    Load knowledge_documents for many ids in one $in query (projected),
+    serving what we can from the in-process chunk cache.
+    Returns {doc_id_str: doc}.
+    """
+    wanted = {str(d) for d in doc_ids if d}
+    if not wanted:
+        return {}
+    found = doc_cache.get_many(wanted)
+    missing = wanted - found.keys()
+    if missing:
+        keys = [_as_db_id(d) for d in missing]
+        fetched = {}
+        for doc in db.knowledge_documents.find({"_id": {"$in": keys}}, DOC_PROJECTION):
+            fetched[str(doc["_id"])] = doc
+        doc_cache.put_many(fetched)
+        found.update(fetched)
+    return found
+
+def prefill_doc_cache(recent_chats: int) -> int:
+    """Load the chunks retrieved by the most recent chats into the doc cache (warmup)."""
+    if recent_chats <= 0:
+        return 0
+    doc_ids = set()
+    cursor = db.chats.find({"metadata.retrieved_doc_ids": {"$exists": True}},
+                           {"metadata.retrieved_doc_ids": 1}).sort("created_at", -1).limit(recent_chats)
+    for chat in cursor:
+        doc_ids.update(chat["metadata"]["retrieved_doc_ids"])
+    return len(fetch_documents(doc_ids))
+
+def hydrate_hits(hits_per_query: list) -> list:
+    """
+    hits_per_query: list of FAISS hit lists ([{"doc_id", "score"}, ...]), one per query.
+    Returns one [{"doc", "score"}, ...] list per query, in FAISS rank order,
+    using a single Mongo round trip for all queries.
+    """
+    docs_by_id = fetch_documents(h.get("doc_id") for hits in hits_per_query for h in hits)
+    out = []
+    for hits in hits_per_query:
+        docs = []
+        for r in hits:
+            doc = docs_by_id.get(r.get("doc_id"))
+            if doc:
+                docs.append({"doc": doc, "score": r.get("score")})
+        out.append(docs)
+    return out
+
+def _ensure_index():
+    # an empty index answers with no hits; warmup, the seed ingest job and the refresh
+    # timer fill it, never the request path
+    return _local_index_manager().current
+
+def get_query_batcher() -> QueryBatcher:
+    global _BATCHER_SINGLETON
+    if _BATCHER_SINGLETON is None:
+        with _singletons_lock:
+            if _BATCHER_SINGLETON is None:
+                _BATCHER_SINGLETON = QueryBatcher(_top_k_local)
+    return _BATCHER_SINGLETON
+
+def top_k_documents(query: str, k=5, filters: dict = None):
+    """
+    Top-k documents for one query. With QUERY_MICROBATCH_ENABLED, concurrent callers
+    are coalesced into one batched embed + search (see batcher.QueryBatcher).
+    """
+    if sidecar_enabled():
+        # the sidecar micro-batches across all workers
+        return top_k_documents_batch([query], k=k, filters=filters)[0]
+    if settings.QUERY_MICROBATCH_ENABLED:
+        return get_query_batcher().search(query, k=k, filters=filters)
+    return top_k_documents_batch([query], k=k, filters=filters)[0]
+
+async def atop_k_documents(query: str, k=5, filters: dict = None):
+    """top_k_documents for coroutines: waits on the micro-batcher without blocking the event loop."""
+    if settings.QUERY_MICROBATCH_ENABLED and not sidecar_enabled():
+        return await get_query_batcher().asearch(query, k=k, filters=filters)
+    return await asyncio.to_thread(top_k_documents, query, k, filters)
+
+def top_k_documents_batch(queries: list, k=5, filters: dict = None, return_vectors: bool = False):
+    """
+    Retrieve top-k documents for many queries: one embed call, one FAISS search
+    and one Mongo hydration query. Returns a list of doc lists (same order as queries).
+    filters: optional metadata filter applied inside FAISS, e.g. {"source": "seed", "concept": "bfs"}
+    return_vectors: return (doc lists, normalized query vectors) so callers don't embed again
+    """
+    if not queries:
+        return ([], np.zeros((0, settings.EMBEDDING_DIM), dtype="float32")) if return_vectors else []
+    if sidecar_enabled():
+        return call_or_fallback("search", _top_k_local, list(queries), k=k, filters=filters,
+                                return_vectors=return_vectors)
+    return _top_k_local(queries, k=k, filters=filters, return_vectors=return_vectors)
+
+def _top_k_local(queries: list, k=5, filters: dict = None, return_vectors: bool = False):
+    index = _ensure_index()
+    if index.ntotal == 0 and not return_vectors:
+        return [[] for _ in queries]
+
+    embs, normed = embed_texts(list(queries), use_cache=True)
+    docs = hydrate_hits(index.search_batch(normed, top_k=k, filters=filters))
+    return (docs, normed) if return_vectors else docs
@@ -0,0 +1,143 @@
+# backend/app/retriever/snapshot_store.py
+"""
+FAISS index snapshots in GridFS, so a host with a wiped disk (e.g. a Render cold start)
+can download the last saved index instead of re-reading every embedding.
+
+A snapshot is one GridFS file in the `faiss_snapshots` bucket: an uncompressed tar of the
+index files (.idx, .ids.npy, .conf and .vecs when present). Its sha256, dim, embedding model,
+generation and refresh watermark are stored in the file's metadata; downloads are verified
+against the checksum and snapshots for another model/dim are ignored.
+"""
+import os
+import io
+import hashlib
+import tarfile
+import datetime
+import gridfs
+from ..core.config import settings
+from ..db.mongo import db
+
+BUCKET = "faiss_snapshots"
+# index file suffixes (appended to FAISS_INDEX_PATH) that make up a snapshot
+SNAPSHOT_SUFFIXES = (".idx", ".ids.npy", ".conf", ".vecs")
+_CHUNK = 1024 * 1024
+
+_fs = None
+
+def _grid():
+    global _fs
+    if _fs is None:
+        _fs = gridfs.GridFS(db, collection=BUCKET)
+    return _fs
+
+class _HashingWriter(io.RawIOBase):
+    """File-like wrapper that hashes everything written through it."""
+
+    def __init__(self, out):
+        self.out = out
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.sha.update(b)
+        self.out.write(b)
+        self.size += len(b)
+        return len(b)
+
+def upload_snapshot(base_path: str, dim: int, generation: int = 0, watermark=None, ntotal: int = 0,
+                    filename: str = None):
+    """
+    Upload the index files at base_path + SNAPSHOT_SUFFIXES as a new snapshot and prune
+    old ones (keeps FAISS_SNAPSHOT_KEEP). Returns the GridFS file id, or None if nothing was found.
+    filename: snapshot name when base_path is a staging copy (default: basename of base_path)
+    """
+    members = [s for s in SNAPSHOT_SUFFIXES if os.path.exists(base_path + s)]
+    if ".idx" not in members:
+        return None
+    filename = filename or os.path.basename(base_path)
+    fs = _grid()
+    grid_in = fs.new_file(filename=filename, contentType="application/x-tar")
+    try:
+        writer = _HashingWriter(grid_in)
+        with tarfile.open(fileobj=writer, mode="w|") as tar:
+            for suffix in members:
+                tar.add(base_path + suffix, arcname=suffix)
+        wm = None
+        if watermark is not None:
+            wm = {"created_at": watermark[0], "_id": watermark[1]}
+        # set before close() so the file becomes visible with its checksum in one write
+        grid_in.metadata = {
+            "sha256": writer.sha.hexdigest(),
+            "dim": dim,
+            "model": settings.EMBEDDING_MODEL,
+            "generation": generation,
+            "watermark": wm,
+            "ntotal": ntotal,
+            "members": members,
+            "saved_at": datetime.datetime.utcnow(),
+        }
+        grid_in.close()
+    except Exception:
+        grid_in.abort()
+        raise
+    print(f"[snapshot] uploaded {writer.size / 1e6:.1f} MB index snapshot (ntotal={ntotal}, generation={generation})")
+    _prune(fs, filename)
+    return grid_in._id
+
+def _prune(fs, filename: str):
+    keep = max(int(settings.FAISS_SNAPSHOT_KEEP), 1)
+    old = fs.find({"filename": filename}).sort("uploadDate", -1).skip(keep)
+    for f in list(old):
+        fs.delete(f._id)
+
+def download_latest(base_path: str, dim: int) -> dict:
+    """
+    Restore the newest valid snapshot for this dim/model into base_path + suffixes.
+    Returns the snapshot metadata, or None if no usable snapshot exists.
+    """
+    fs = _grid()
+    query = {
+        "filename": os.path.basename(base_path),
+        "metadata.dim": dim,
+        "metadata.model": settings.EMBEDDING_MODEL,
+    }
+    tmp = f"{base_path}.snapshot-{os.getpid()}"
+    for grid_out in fs.find(query).sort("uploadDate", -1):
+        meta = grid_out.metadata or {}
+        try:
+            sha = hashlib.sha256()
+            with open(tmp, "wb") as f:
+                while True:
+                    chunk = grid_out.read(_CHUNK)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    f.write(chunk)
+            if sha.hexdigest() != meta.get("sha256"):
+                print(f"[snapshot] checksum mismatch for snapshot {grid_out._id}; trying an older one")
+                continue
+            with tarfile.open(tmp, mode="r:") as tar:
+                for member in tar.getmembers():
+                    if member.name not in SNAPSHOT_SUFFIXES or not member.isfile():
+                        continue
+                    target = base_path + member.name
+                    part = f"{target}.tmp-{os.getpid()}"
+                    with tar.extractfile(member) as src, open(part, "wb") as dst:
+                        while True:
+                            chunk = src.read(_CHUNK)
+                            if not chunk:
+                                break
+                            dst.write(chunk)
+                    os.replace(part, target)
+            print(f"[snapshot] restored index snapshot {grid_out._id} "
+                  f"(ntotal={meta.get('ntotal')}, saved {meta.get('saved_at')})")
+            return meta
+        except Exception as e:
+            print(f"[snapshot] failed to restore snapshot {grid_out._id}:", e)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return None
@@ -0,0 +1,210 @@
+# backend/app/scraper/async_fetcher.py
+"""
+Concurrent page fetcher on one pooled httpx.AsyncClient.
+- is_allowed() is checked before every request, including each redirect hop
+- per host: at most SCRAPER_PER_HOST_CONCURRENCY requests in flight, and request starts spaced
+  SCRAPER_POLITENESS_DELAY seconds apart
+- retries 429/5xx/connection errors with exponential backoff (honors Retry-After)
+- on-disk conditional-GET cache (SCRAPER_CACHE_DIR): pages served with an ETag/Last-Modified are
+  stored and revalidated with If-None-Match/If-Modified-Since; a 304 returns the cached body
+  without downloading it again
+
+    results = fetch_urls(urls)               # sync callers (ingest jobs, seed script)
+    async with AsyncFetcher() as f:          # async callers
+        results = await f.fetch_many(urls)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from urllib.parse import urljoin, urlparse
+import httpx
+from ..core.config import settings
+from .fetcher import is_allowed
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_REDIRECTS = 5
+# seconds; longer Retry-After values are capped
+MAX_RETRY_AFTER = 60
+
+@dataclass
+class FetchResult:
+    url: str
+    text: str = None
+    status: int = None
+    # body came from the on-disk cache after a 304
+    not_modified: bool = False
+    error: str = None
+
+    @property
+    def ok(self) -> bool:
+        return self.text is not None
+
+class PageCache:
+    """url -> (validators, body) files under cache_dir; writes are atomic (tmp + rename)."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".json", base + ".body"
+
+    def get(self, url: str):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, encoding="utf-8") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def put(self, url: str, response: httpx.Response):
+        meta = {
+            "url": url,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "fetched_at": time.time(),
+        }
+        if not meta["etag"] and not meta["last_modified"]:
+            return  # nothing to revalidate with
+        meta_path, body_path = self._paths(url)
+        for path, data in ((body_path, response.text), (meta_path, json.dumps(meta))):
+            tmp = f"{path}.tmp{os.getpid()}"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+class AsyncFetcher:
+    def __init__(self, per_host: int = None, delay: float = None, cache_dir: str = None,
+                 timeout: float = None, retries: int = None, headers: dict = None):
+        self.per_host = max(per_host or settings.SCRAPER_PER_HOST_CONCURRENCY, 1)
+        self.delay = settings.SCRAPER_POLITENESS_DELAY if delay is None else delay
+        self.timeout = timeout or settings.SCRAPER_TIMEOUT
+        self.retries = settings.SCRAPER_RETRIES if retries is None else retries
+        self.headers = headers or {"User-Agent": settings.SCRAPER_USER_AGENT}
+        cache_dir = settings.SCRAPER_CACHE_DIR if cache_dir is None else cache_dir
+        self.cache = PageCache(cache_dir) if cache_dir else None
+        self._client = None
+        self._host_slots = {}
+        self._host_next = {}
+        self._host_locks = {}
+        self.stats = {"requests": 0, "downloaded": 0, "not_modified": 0, "failed": 0, "retries": 0}
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=self.timeout,
+            # redirects are followed in _get so every hop passes is_allowed()
+            follow_redirects=False,
+            limits=httpx.Limits(max_connections=settings.SCRAPER_MAX_CONNECTIONS,
+                                max_keepalive_connections=settings.SCRAPER_MAX_CONNECTIONS),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    async def _polite_slot(self, host: str):
+        """Hold until this host's next request may start (per-host spacing)."""
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._host_next.get(host, 0.0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._host_next[host] = time.monotonic() + self.delay
+
+    async def _get(self, url: str, headers: dict) -> httpx.Response:
+        for _ in range(MAX_REDIRECTS):
+            r = await self._client.get(url, headers=headers)
+            if not r.has_redirect_location:
+                return r
+            url = urljoin(url, r.headers["location"])
+            if not is_allowed(url):
+                raise PermissionError(f"redirected to a domain that is not allowed: {url}")
+        raise httpx.TooManyRedirects(f"more than {MAX_REDIRECTS} redirects", request=r.request)
+
+    async def fetch(self, url: str) -> FetchResult:
+        if not is_allowed(url):
+            return FetchResult(url, error="domain not allowed")
+        host = urlparse(url).netloc
+        slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        meta, cached_body = self.cache.get(url) if self.cache else (None, None)
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        error = None
+        backoff = 1.0
+        async with slots:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(backoff)
+                await self._polite_slot(host)
+                self.stats["requests"] += 1
+                backoff = 2 ** attempt
+                try:
+                    r = await self._get(url, headers)
+                except PermissionError as e:
+                    error = str(e)
+                    break
+                except httpx.HTTPError as e:
+                    error = f"request failed: {e}"
+                    continue
+                if r.status_code == 304 and cached_body is not None:
+                    self.stats["not_modified"] += 1
+                    return FetchResult(url, text=cached_body, status=304, not_modified=True)
+                if r.status_code in RETRY_STATUSES:
+                    error = f"HTTP {r.status_code}"
+                    retry_after = r.headers.get("retry-after", "")
+                    if retry_after.isdigit():
+                        # a server asking for a long pause shouldn't stall the whole job
+                        backoff = min(float(retry_after), MAX_RETRY_AFTER)
+                    continue
+                if r.status_code >= 400 or r.status_code == 304:
+                    error = f"HTTP {r.status_code}"
+                    break
+                self.stats["downloaded"] += 1
+                if self.cache:
+                    try:
+                        self.cache.put(url, r)
+                    except OSError as e:
+                        print(f"[async_fetcher] warning: cache write failed for {url}: {e}")
+                return FetchResult(url, text=r.text, status=r.status_code)
+        self.stats["failed"] += 1
+        print(f"[async_fetcher] {url}: {error}")
+        return FetchResult(url, error=error)
+
+    async def fetch_many(self, urls: list, on_result=None) -> list:
+        """
+        Fetch all urls concurrently (within the per-host limits); results in input order.
+        on_result: called with each FetchResult as soon as it completes (in a worker thread,
+                   so it may block, e.g. to record progress)
+        """
+        async def _one(url):
+            result = await self.fetch(url)
+            if on_result is not None:
+                await asyncio.to_thread(on_result, result)
+            return result
+
+        return list(await asyncio.gather(*[_one(u) for u in urls]))
+
+async def afetch_urls(urls: list, on_result=None, **kwargs) -> list:
+    async with AsyncFetcher(**kwargs) as fetcher:
+        started = time.perf_counter()
+        results = await fetcher.fetch_many(urls, on_result=on_result)
+        print(f"[async_fetcher] {len(urls)} urls in {time.perf_counter() - started:.1f}s: {fetcher.stats}")
+        return results
+
+def fetch_urls(urls: list, on_result=None, **kwargs) -> list:
+    """Sync entry point (must not be called from a running event loop)."""
+    return asyncio.run(afetch_urls(urls, on_result=on_result, **kwargs))
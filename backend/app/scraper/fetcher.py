@@ -1,6 +1,5 @@
 # backend/app/scraper/fetcher.py
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 
 ALLOWED_DOMAINS = [
@@ -28,6 +27,8 @@ def simple_fetch(url, timeout=10, allow_redirects=True):
         return None
 
 def extract_text_from_html(html):
+    # imported here so importing app.main doesn't pull in BeautifulSoup
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
     for s in soup(["script", "style", "noscript"]):
         s.extract()
@@ -0,0 +1,165 @@
+# backend/app/sidecar/client.py
+"""
+Client side of the embedding/search sidecar (see app/sidecar/server.py).
+
+When SIDECAR_SOCKET is set, embed_texts(), top_k_documents() and the index manager in each
+web worker forward to one shared sidecar process over a Unix socket instead of loading their
+own SentenceTransformer and FAISS index. Calls fall back to in-process work (with a warning)
+while the sidecar is unreachable, unless SIDECAR_FALLBACK_LOCAL is off.
+"""
+import os
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client
+from ..core.config import settings
+
+class SidecarUnavailable(RuntimeError):
+    pass
+
+class SidecarClient:
+    """Small pool of connections; each call borrows one for a single request/response."""
+
+    def __init__(self, address: str, authkey: bytes, pool_size: int = 8):
+        self.address = address
+        self.authkey = authkey
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._down_until = 0.0
+
+    def _connect(self):
+        return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+
+    def call(self, op: str, *args, **kwargs):
+        if time.monotonic() < self._down_until:
+            raise SidecarUnavailable(f"sidecar at {self.address} is down")
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+            for attempt in range(2):
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    conn.send((op, args, kwargs))
+                    ok, payload = conn.recv()
+                    break
+                except (OSError, EOFError) as e:
+                    # stale pooled connection (sidecar restarted): retry once on a fresh one
+                    if conn is not None:
+                        conn.close()
+                    conn = None
+                    if attempt == 1:
+                        # don't hammer a dead socket on every request
+                        self._down_until = time.monotonic() + 5
+                        raise SidecarUnavailable(f"sidecar at {self.address} unreachable: {e}") from e
+            self._idle.put(conn)
+        if not ok:
+            exc_type, message = payload
+            if exc_type == "ValueError":
+                raise ValueError(message)
+            raise RuntimeError(f"sidecar {op} failed: {exc_type}: {message}")
+        return payload
+
+_client = None
+_client_lock = threading.Lock()
+
+def sidecar_enabled() -> bool:
+    return bool(settings.SIDECAR_SOCKET)
+
+def authkey_path(address: str) -> str:
+    return address + ".key"
+
+def sidecar_authkey(address: str, create: bool = False) -> bytes:
+    """
+    SIDECAR_AUTHKEY, or the key file next to the socket. create=True (the sidecar)
+    generates the file (mode 0600) when it doesn't exist yet.
+    """
+    if settings.SIDECAR_AUTHKEY:
+        return settings.SIDECAR_AUTHKEY.encode()
+    path = authkey_path(address)
+    if create and not os.path.exists(path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip().encode()
+    except FileNotFoundError:
+        raise SidecarUnavailable(f"no SIDECAR_AUTHKEY and no key file at {path} (is the sidecar running?)")
+
+def get_sidecar() -> SidecarClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            address = settings.SIDECAR_SOCKET
+            _client = SidecarClient(address, sidecar_authkey(address))
+        return _client
+
+def call_or_fallback(op: str, fallback, *args, **kwargs):
+    """Run `op` on the sidecar; if it is unreachable, run fallback(*args, **kwargs) locally."""
+    try:
+        return get_sidecar().call(op, *args, **kwargs)
+    except SidecarUnavailable as e:
+        if not settings.SIDECAR_FALLBACK_LOCAL:
+            raise
+        print(f"[sidecar] warning: {e}; running {op} in-process")
+        return fallback(*args, **kwargs)
+
+class RemoteIndexView:
+    """Read-only stand-in for FaissIndex attributes callers inspect (ntotal, dim, type)."""
+
+    def __init__(self, info: dict):
+        self.ntotal = info.get("ntotal", 0)
+        self.dim = info.get("dim", settings.EMBEDDING_DIM)
+        self.index_type = info.get("index_type")
+        self.index_kind = info.get("index_kind")
+        self.generation = info.get("generation", 0)
+
+class RemoteIndexManager:
+    """IndexManager interface backed by the sidecar's index (writes are applied there)."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sidecar-index")
+
+    def _run(self, op: str, wait: bool, *args, **kwargs):
+        if wait:
+            return get_sidecar().call(op, *args, **kwargs)
+        return self._executor.submit(get_sidecar().call, op, *args, **kwargs)
+
+    @property
+    def current(self) -> RemoteIndexView:
+        return RemoteIndexView(get_sidecar().call("index_info"))
+
+    @property
+    def generation(self) -> int:
+        return self.current.generation
+
+    def load(self, wait: bool = True):
+        # the sidecar loads its own index at startup; nothing to do here
+        if wait:
+            return None
+        fut = Future()
+        fut.set_result(None)
+        return fut
+
+    def rebuild(self, index_type: str = None, wait: bool = False):
+        return self._run("rebuild", wait, index_type=index_type)
+
+    def refresh(self, detect_deletions: bool = False, wait: bool = False):
+        return self._run("refresh", wait, detect_deletions=detect_deletions)
+
+    def add(self, normed_vectors, doc_ids, wait: bool = True):
+        return self._run("add", wait, normed_vectors, list(doc_ids))
+
+    def maybe_compact(self, wait: bool = False):
+        return self._run("maybe_compact", wait)
+
+    def compact(self, wait: bool = False):
+        return self._run("compact", wait)
+
+    def status(self) -> dict:
+        return {**get_sidecar().call("status"), "sidecar": settings.SIDECAR_SOCKET}
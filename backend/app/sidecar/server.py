@@ -0,0 +1,145 @@
+# backend/app/sidecar/server.py
+"""
+Embedding/search sidecar: one process owns the SentenceTransformer and the FAISS index and
+serves every web worker over a Unix socket (multiprocessing.connection, pickled messages).
+
+Run it next to the web workers, with the same .env plus SIDECAR_SOCKET:
+    cd backend && SIDECAR_SOCKET=/tmp/adaptive-tutor.sock python -m app.sidecar.server
+    SIDECAR_SOCKET=/tmp/adaptive-tutor.sock gunicorn app.main:app -k uvicorn.workers.UvicornWorker -w 4
+
+The socket is owner-only and connections must present the shared authkey (SIDECAR_AUTHKEY, or
+a random key the sidecar writes to SIDECAR_SOCKET + ".key"), so run the workers as the same user.
+
+Math libraries are pinned to SIDECAR_THREADS (default: all cores) in this process only,
+so N workers no longer each spin up a full-size OpenMP/torch pool on the same cores.
+"""
+import os
+import threading
+from ..core.config import settings
+
+_THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+def _pin_threads() -> int:
+    # must run before numpy/faiss/torch are imported so their pools pick it up
+    threads = settings.SIDECAR_THREADS or os.cpu_count() or 1
+    for var in _THREAD_VARS:
+        os.environ[var] = str(threads)
+    # the tokenizer pool would add another set of threads per request
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    return threads
+
+def _make_ops():
+    from ..embeddings.embedder import embed_texts, query_cache_stats
+    from ..retriever.retriever import get_index_manager, get_query_batcher, top_k_documents, top_k_documents_batch
+
+    manager = get_index_manager()
+
+    def search(queries, k=5, filters=None, return_vectors=False):
+        if len(queries) == 1 and not return_vectors:
+            # single queries from many workers share the sidecar's micro-batches
+            return [top_k_documents(queries[0], k=k, filters=filters)]
+        return top_k_documents_batch(queries, k=k, filters=filters, return_vectors=return_vectors)
+
+    def index_info():
+        idx = manager.current
+        return {"ntotal": idx.ntotal, "dim": idx.dim, "index_type": idx.index_type,
+                "index_kind": idx.index_kind, "generation": idx.generation}
+
+    def status():
+        return {**manager.status(), "query_batcher": get_query_batcher().stats(),
+                "query_embed_cache": dict(query_cache_stats), "pid": os.getpid()}
+
+    return {
+        "ping": lambda: "pong",
+        "embed": lambda texts, use_cache=False: embed_texts(texts, use_cache=use_cache),
+        "search": search,
+        "index_info": index_info,
+        "status": status,
+        "add": lambda normed, doc_ids: manager.add(normed, doc_ids, wait=True),
+        "rebuild": lambda index_type=None: manager.rebuild(index_type=index_type, wait=True),
+        "refresh": lambda detect_deletions=False: manager.refresh(detect_deletions=detect_deletions, wait=True),
+        "maybe_compact": lambda: manager.maybe_compact(wait=True),
+        "compact": lambda: manager.compact(wait=True),
+    }
+
+def _serve_connection(conn, ops):
+    try:
+        while True:
+            try:
+                op, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = (True, ops[op](*args, **kwargs))
+            except KeyError as e:
+                reply = (False, ("KeyError", f"unknown op {op!r}" if op not in ops else str(e)))
+            except Exception as e:
+                reply = (False, (type(e).__name__, str(e)))
+            conn.send(reply)
+    finally:
+        conn.close()
+
+def main():
+    address = settings.SIDECAR_SOCKET
+    if not address:
+        raise SystemExit("Set SIDECAR_SOCKET (e.g. /tmp/adaptive-tutor.sock) to run the sidecar.")
+    threads = _pin_threads()
+    # this process does the real work: every call below must take the in-process path
+    settings.SIDECAR_SOCKET = ""
+
+    import faiss
+    faiss.omp_set_num_threads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+    from multiprocessing.connection import Listener
+    from ..embeddings.embedder import get_model
+    from ..retriever.retriever import get_index_manager, prefill_doc_cache
+    from ..tasks.scheduler import start_scheduler
+    from ..db.mongo import ensure_indexes
+    from .client import sidecar_authkey
+
+    print(f"[sidecar] loading model and index ({threads} math threads)")
+    ensure_indexes()
+    get_model()
+    manager = get_index_manager()
+    if manager.current.ntotal == 0:
+        manager.rebuild(wait=True)
+    else:
+        manager.refresh(wait=True)
+    try:
+        # hydration happens here, so the doc cache worth warming is this process's
+        prefill_doc_cache(settings.WARMUP_DOC_PREFILL_CHATS)
+    except Exception as e:
+        print("[sidecar] warning: doc cache prefill failed:", e)
+    # index maintenance (refresh / compaction) runs here instead of in every worker
+    start_scheduler()
+    ops = _make_ops()
+
+    if os.path.exists(address):
+        os.remove(address)
+    authkey = sidecar_authkey(address, create=True)
+    # the socket is created owner-only (rw) at bind time, so it is never reachable by others
+    old_umask = os.umask(0o177)
+    try:
+        listener = Listener(address, family="AF_UNIX", backlog=128, authkey=authkey)
+    finally:
+        os.umask(old_umask)
+    print(f"[sidecar] serving on {address} (ntotal={manager.current.ntotal}, pid={os.getpid()})")
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # bad authkey / half-open client: keep serving the others
+                print("[sidecar] warning: rejected connection:", e)
+                continue
+            threading.Thread(target=_serve_connection, args=(conn, ops), daemon=True).start()
+    finally:
+        listener.close()
+
+if __name__ == "__main__":
+    main()
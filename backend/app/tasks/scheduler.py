@@ -1,14 +1,37 @@
 # app/tasks/scheduler.py
-from apscheduler.schedulers.background import BackgroundScheduler
-from app.retriever.retriever import get_index
+from app.retriever.retriever import get_index_manager
+from app.embeddings.embedder import save_query_cache
+from app.core.config import settings
 import atexit
 import time
 
 def start_scheduler():
+    # imported here so importing app.main doesn't pull in APScheduler
+    from apscheduler.schedulers.background import BackgroundScheduler
     sched = BackgroundScheduler()
-    # rebuild index nightly at 03:00 AM server time
-    sched.add_job(lambda: get_index().build_from_db(), 'cron', hour=3, minute=0)
+    if not settings.SIDECAR_SOCKET:
+        _add_index_jobs(sched)
+    # else: the sidecar owns the index and the query cache and runs these jobs itself
     sched.start()
     # ensure scheduler will shut down on process exit
     atexit.register(lambda: sched.shutdown(wait=False))
     return sched
+
+def _add_index_jobs(sched):
+    # nightly at 03:00 AM server time: add new embeddings and drop deleted ones (O(new docs))
+    sched.add_job(lambda: get_index_manager().refresh(detect_deletions=True), 'cron', hour=3, minute=0)
+    # weekly full rebuild: incremental refreshes never re-pick the index type or retrain IVF lists
+    if settings.INDEX_REBUILD_DAY:
+        sched.add_job(lambda: get_index_manager().rebuild(), 'cron', day_of_week=settings.INDEX_REBUILD_DAY,
+                      hour=4, minute=0)
+    # pick up embeddings written by other processes (e.g. seed scripts) every few minutes
+    if settings.INDEX_REFRESH_MINUTES > 0:
+        sched.add_job(lambda: get_index_manager().refresh(), 'interval', minutes=settings.INDEX_REFRESH_MINUTES)
+    # fold the FAISS delta log into the main index once it is old enough
+    sched.add_job(lambda: get_index_manager().maybe_compact(), 'interval', minutes=1)
+    # upload the index files to GridFS when they changed (compactions, removals)
+    if settings.FAISS_SNAPSHOT_GRIDFS and settings.FAISS_SNAPSHOT_INTERVAL_MINUTES > 0:
+        sched.add_job(lambda: get_index_manager().publish_snapshot(wait=True), 'interval',
+                      minutes=settings.FAISS_SNAPSHOT_INTERVAL_MINUTES)
+    # persist the query embedding cache (no-op unless QUERY_EMBED_CACHE_PATH is set)
+    sched.add_job(save_query_cache, 'interval', minutes=10)
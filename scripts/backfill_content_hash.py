@@ -0,0 +1,81 @@
+# scripts/backfill_content_hash.py
+"""
+Add content_hash (see app/ingest/ingester.py) to knowledge_documents and their embeddings rows
+that were ingested before content-hash dedup existed, so re-seeding skips them too.
+
+Usage:
+    python scripts/backfill_content_hash.py [--batch 1000] [--delete-duplicates] [--dry-run]
+
+--delete-duplicates keeps the oldest chunk per (url, content_hash) and deletes the other
+knowledge_documents + embeddings rows. Afterwards drop their vectors from the live index with
+POST /admin/index/refresh?detect_deletions=true (or a rebuild).
+Rows are paged by _id, so the script can be stopped and re-run.
+"""
+import os, sys, argparse, time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+sys.path.insert(0, BASE_DIR)
+
+from pymongo import UpdateOne, UpdateMany
+from app.core.config import settings
+from app.db.mongo import db, ensure_indexes
+from app.ingest.ingester import content_hash
+
+def backfill(batch=1000, dry_run=False):
+    query = {"content_hash": {"$exists": False}}
+    total = db.knowledge_documents.count_documents(query)
+    print(f"[backfill] {total} chunks without content_hash")
+    started = time.perf_counter()
+    done = 0
+    last_id = None
+    while True:
+        q = dict(query)
+        if last_id is not None:
+            q["_id"] = {"$gt": last_id}
+        rows = list(db.knowledge_documents.find(q, {"text": 1}).sort("_id", 1).limit(batch))
+        if not rows:
+            break
+        last_id = rows[-1]["_id"]
+        doc_ops, emb_ops = [], []
+        for d in rows:
+            h = content_hash(d.get("text") or "")
+            doc_ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {"content_hash": h}}))
+            # only vectors from the current model may be reused under this hash
+            emb_ops.append(UpdateMany({"doc_id": str(d["_id"]), "vector_model": settings.EMBEDDING_MODEL},
+                                      {"$set": {"content_hash": h}}))
+        if not dry_run:
+            db.knowledge_documents.bulk_write(doc_ops, ordered=False)
+            db.embeddings.bulk_write(emb_ops, ordered=False)
+        done += len(rows)
+        print(f"[backfill] {done}/{total} chunks hashed")
+    print(f"[backfill] {'would hash' if dry_run else 'hashed'} {done} chunks in {time.perf_counter() - started:.1f}s")
+    return done
+
+def delete_duplicates(dry_run=False):
+    groups = db.knowledge_documents.aggregate([
+        {"$match": {"content_hash": {"$exists": True}}},
+        {"$group": {"_id": {"url": "$url", "h": "$content_hash"}, "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    extra = []
+    for g in groups:
+        extra.extend(sorted(g["ids"])[1:])
+    print(f"[backfill] {len(extra)} duplicate chunks (same url + content_hash)")
+    if extra and not dry_run:
+        for i in range(0, len(extra), 1000):
+            part = extra[i:i + 1000]
+            db.embeddings.delete_many({"doc_id": {"$in": [str(x) for x in part]}})
+            db.knowledge_documents.delete_many({"_id": {"$in": part}})
+        print("[backfill] deleted; run POST /admin/index/refresh?detect_deletions=true to drop their vectors")
+    return len(extra)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill content_hash for chunk dedup.")
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--delete-duplicates", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    ensure_indexes()
+    backfill(args.batch, args.dry_run)
+    if args.delete_duplicates:
+        delete_duplicates(args.dry_run)
@@ -0,0 +1,78 @@
+# scripts/eval_quantized_index.py
+"""
+Compare the quantized two-stage index (sq8 codes + exact re-rank) with the exact flat index
+on the current db.embeddings corpus: resident memory, recall@k and query latency.
+
+Usage:
+    python scripts/eval_quantized_index.py [--queries 500] [--k 10] [--factors 1,2,4,8]
+
+Both indexes are built into a temp dir, so the live index files are not touched.
+Queries are stored corpus vectors with a little noise added (no model download needed).
+"""
+import os, sys, argparse, tempfile, time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+sys.path.insert(0, BASE_DIR)
+
+import numpy as np
+import faiss
+from app.core.config import settings
+from app.retriever.faiss_index import FaissIndex
+
+def resident_bytes(idx: FaissIndex) -> int:
+    # vectors/codes held in RAM by the main index (.vecs is mmapped and only touched per shortlist)
+    return faiss.serialize_index(idx.index).nbytes
+
+def timed_search(idx, queries, k):
+    started = time.perf_counter()
+    hits = idx.search_batch(queries, top_k=k)
+    elapsed = time.perf_counter() - started
+    return [[h["doc_id"] for h in row] for row in hits], elapsed * 1000 / len(queries)
+
+def recall_at_k(truth, found, k):
+    return float(np.mean([len(set(t[:k]) & set(f[:k])) / max(len(t[:k]), 1) for t, f in zip(truth, found)]))
+
+def main(n_queries=500, k=10, factors=(1, 2, 4, 8)):
+    dim = settings.EMBEDDING_DIM
+    tmpdir = tempfile.mkdtemp(prefix="faiss-eval-")
+    settings.FAISS_MMAP = False
+    settings.FAISS_SNAPSHOT_GRIDFS = False
+
+    settings.FAISS_INDEX_PATH = os.path.join(tmpdir, "flat")
+    flat = FaissIndex(dim, index_type="flat")
+    if flat.build_from_db() == 0:
+        print("No embeddings in the database; nothing to evaluate.")
+        return
+    settings.FAISS_INDEX_PATH = os.path.join(tmpdir, "sq8")
+    sq8 = FaissIndex(dim, index_type="sq8")
+    sq8.build_from_db()
+
+    n = flat.index.ntotal
+    rng = np.random.default_rng(0)
+    rows = rng.choice(n, size=min(n_queries, n), replace=False)
+    queries = flat.index.reconstruct_batch(rows.astype("int64"))
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype("float32")
+    faiss.normalize_L2(queries)
+
+    truth, flat_ms = timed_search(flat, queries, k)
+    flat_mem = resident_bytes(flat)
+    sq8_mem = resident_bytes(sq8)
+    vecs_disk = os.path.getsize(sq8._vecs_path())
+
+    print(f"corpus: {n} vectors x {dim} dims, {len(queries)} queries, k={k}")
+    print(f"flat   resident: {flat_mem / 1e6:8.2f} MB   {flat_ms:.3f} ms/query")
+    print(f"sq8    resident: {sq8_mem / 1e6:8.2f} MB   (+{vecs_disk / 1e6:.2f} MB .vecs on disk, mmapped)")
+    print(f"memory saved:    {(flat_mem - sq8_mem) / 1e6:8.2f} MB ({1 - sq8_mem / flat_mem:.0%})")
+    for factor in factors:
+        settings.FAISS_RERANK_FACTOR = factor
+        found, ms = timed_search(sq8, queries, k)
+        label = "codes only" if factor <= 1 else f"re-rank x{factor}"
+        print(f"sq8 {label:>13}: recall@{k} = {recall_at_k(truth, found, k):.4f}   {ms:.3f} ms/query")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory / recall report for the sq8 two-stage index.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--factors", default="1,2,4,8", help="comma separated FAISS_RERANK_FACTOR values")
+    args = parser.parse_args()
+    main(args.queries, args.k, tuple(int(f) for f in args.factors.split(",")))
@@ -0,0 +1,110 @@
+# scripts/migrate_embeddings_binary.py
+"""
+Convert legacy db.embeddings rows (embedding + normed_embedding as arrays of doubles)
+to the packed layout: vec (BSON Binary float32/float16), vec_dtype, norm.
+
+Usage:
+    python scripts/migrate_embeddings_binary.py [--dtype float32|float16] [--batch 1000]
+                                                [--keep-arrays] [--dry-run]
+
+Rows are paged by _id, so the script can be stopped and re-run; already-packed rows are skipped.
+The FAISS index does not need a rebuild: it decodes both layouts to the same vectors.
+"""
+import os, sys, argparse, time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+sys.path.insert(0, BASE_DIR)
+
+import bson
+import numpy as np
+from pymongo import UpdateOne
+from app.core.config import settings
+from app.db.mongo import db
+from app.embeddings.vector_codec import VEC_DTYPES, encode_vector
+
+LEGACY_QUERY = {
+    "vec": {"$exists": False},
+    "$or": [{"embedding": {"$exists": True}}, {"normed_embedding": {"$exists": True}}],
+}
+
+def pack_rows(rows, dim, vec_dtype):
+    """Return ({_id: packed fields}, skipped count) for a batch of legacy rows."""
+    packed, raw_rows, normed_only = {}, [], []
+    for e in rows:
+        if isinstance(e.get("embedding"), list) and len(e["embedding"]) == dim:
+            raw_rows.append(e)
+        elif isinstance(e.get("normed_embedding"), list) and len(e["normed_embedding"]) == dim:
+            normed_only.append(e)
+    skipped = len(rows) - len(raw_rows) - len(normed_only)
+
+    if raw_rows:
+        # norm + normalized copy straight from the raw vectors, one op per batch
+        raw = np.asarray([e["embedding"] for e in raw_rows], dtype="float32")
+        norms = np.linalg.norm(raw, axis=1)
+        normed = raw / np.where(norms == 0, 1, norms)[:, None]
+        for e, vec, norm in zip(raw_rows, normed, norms):
+            packed[e["_id"]] = encode_vector(vec, norm, vec_dtype)
+    if normed_only:
+        # the raw vector is gone; keep the normalized one and record its own norm (~1.0)
+        normed = np.asarray([e["normed_embedding"] for e in normed_only], dtype="float32")
+        norms = np.linalg.norm(normed, axis=1)
+        normed = normed / np.where(norms == 0, 1, norms)[:, None]
+        for e, vec, norm in zip(normed_only, normed, norms):
+            packed[e["_id"]] = encode_vector(vec, norm, vec_dtype)
+    return packed, skipped
+
+def migrate(vec_dtype="f4", batch=1000, keep_arrays=False, dry_run=False):
+    dim = settings.EMBEDDING_DIM
+    total = db.embeddings.count_documents(LEGACY_QUERY)
+    print(f"[migrate] {total} legacy embedding rows to pack as {vec_dtype} (dim={dim})")
+    started = time.perf_counter()
+    done = skipped = bytes_before = bytes_after = 0
+    last_id = None
+    projection = {"embedding": 1, "normed_embedding": 1}
+    while True:
+        query = dict(LEGACY_QUERY)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        rows = list(db.embeddings.find(query, projection).sort("_id", 1).limit(batch))
+        if not rows:
+            break
+        last_id = rows[-1]["_id"]
+        packed, bad = pack_rows(rows, dim, vec_dtype)
+        skipped += bad
+
+        ops = []
+        for e in rows:
+            fields = packed.get(e["_id"])
+            if fields is None:
+                continue
+            bytes_before += len(bson.encode({k: v for k, v in e.items() if k != "_id"}))
+            after = dict(fields)
+            if keep_arrays:
+                after.update({k: v for k, v in e.items() if k != "_id"})
+            bytes_after += len(bson.encode(after))
+            update = {"$set": fields}
+            if not keep_arrays:
+                update["$unset"] = {"embedding": "", "normed_embedding": ""}
+            ops.append(UpdateOne({"_id": e["_id"]}, update))
+        if ops and not dry_run:
+            db.embeddings.bulk_write(ops, ordered=False)
+        done += len(ops)
+        print(f"[migrate] {done}/{total} rows packed ({skipped} skipped)")
+
+    elapsed = time.perf_counter() - started
+    saved = bytes_before - bytes_after
+    print(f"[migrate] {'would pack' if dry_run else 'packed'} {done} rows in {elapsed:.1f}s; "
+          f"vector bytes {bytes_before:,} -> {bytes_after:,} ({saved:,} saved)")
+    if skipped:
+        print(f"[migrate] {skipped} rows had no usable {dim}-dim vector and were left as-is")
+    return done
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack db.embeddings vectors into BSON Binary.")
+    parser.add_argument("--dtype", choices=sorted(VEC_DTYPES), default="float32")
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--keep-arrays", action="store_true",
+                        help="keep the legacy array fields next to the packed vector")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    migrate(VEC_DTYPES[args.dtype], args.batch, args.keep_arrays, args.dry_run)
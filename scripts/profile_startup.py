@@ -0,0 +1,54 @@
+# scripts/profile_startup.py
+"""
+Profile the cold start of the API: runs `python -X importtime -c "import app.main"` in a fresh
+interpreter and prints the slowest imports (cumulative) plus which heavy modules got loaded.
+
+Usage:
+    python scripts/profile_startup.py [--top 25] [--fail-on-heavy]
+
+--fail-on-heavy exits non-zero when importing app.main pulls in a module from
+app.core.startup.HEAVY_MODULES (they should only load during warmup).
+"""
+import sys, os, argparse, subprocess
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend"))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.core.startup import HEAVY_MODULES
+
+def run_importtime():
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-3000:])
+        sys.exit("import app.main failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cum_us), len(name) - len(name.lstrip())))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--fail-on-heavy", action="store_true")
+    args = parser.parse_args()
+
+    rows = run_importtime()
+    total = next((cum for name, _, cum, _ in rows if name == "app.main"), sum(r[1] for r in rows))
+    print(f"import app.main: {total / 1000:.0f} ms ({len(rows)} modules)\n")
+    print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+    for name, self_us, cum_us, _ in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{cum_us / 1000:13.1f} {self_us / 1000:8.1f}  {name}")
+
+    loaded = sorted({name.split(".")[0] for name, *_ in rows} & set(HEAVY_MODULES))
+    print("\nheavy modules imported by app.main:", ", ".join(loaded) or "none")
+    if loaded and args.fail_on_heavy:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import numpy as np
 from app.core.config import settings
 from app.db.mongo import db
 from app.retriever.faiss_index import FaissIndex
+from app.embeddings.vector_codec import decode_vector, encode_vector
 import traceback
 
 def safe_array(obj):
@@ -38,11 +39,21 @@ def build_index_from_db():
     faiss_idx = FaissIndex(dim)
     vectors = []
     doc_ids = []
-    cursor = db.embeddings.find({})
+    cursor = db.embeddings.find({}).batch_size(4096)
     count = 0
     bad = 0
     for e in cursor:
         count += 1
+        if e.get("vec") is not None:
+            # packed row: already normalized, read straight from the BSON bytes
+            arr = decode_vector(e)
+            if arr.shape[0] != dim:
+                print(f"Skipping doc {e.get('_id')} — dim mismatch {arr.shape[0]} != expected {dim}")
+                bad += 1
+                continue
+            vectors.append(arr)
+            doc_ids.append(str(e.get("doc_id") or e.get("_id")))
+            continue
         emb_raw = e.get("normed_embedding") or e.get("embedding")
         arr = safe_array(emb_raw)
         if arr is None:
@@ -52,9 +63,10 @@ def build_index_from_db():
         if e.get("normed_embedding") is None:
             if arr.ndim != 1:
                 arr = arr.reshape(-1)
+            norm = float(np.linalg.norm(arr))
             arr = ensure_normed(arr.astype("float32"))
             try:
-                db.embeddings.update_one({"_id": e["_id"]}, {"$set": {"normed_embedding": arr.tolist()}})
+                db.embeddings.update_one({"_id": e["_id"]}, {"$set": encode_vector(arr, norm)})
             except Exception as upd_e:
                 print("Warning: failed to update normed_embedding in db:", upd_e)
         else:
@@ -81,6 +93,8 @@ def build_index_from_db():
     faiss_idx.doc_ids = doc_ids
     faiss_idx.save()
     print("Built faiss index with ntotal:", faiss_idx.index.ntotal)
+    # skipped while a running server holds the publisher lock; its snapshot timer uploads the new files
+    faiss_idx.publish_snapshot()
 
 if __name__ == "__main__":
     try:
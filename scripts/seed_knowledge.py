@@ -3,7 +3,6 @@ import sys
 import os
 import traceback
 import time
-import random
 import json
 import csv
 import datetime
@@ -15,10 +14,9 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backen
 sys.path.insert(0, BASE_DIR)
 
 from app.scraper.fetcher import simple_fetch, extract_text_from_html, is_allowed
-from app.ingest.chunker import basic_chunk_text
-from app.embeddings.embedder import embed_texts
-from app.db.mongo import db
-from app.core.config import settings
+from app.scraper.async_fetcher import fetch_urls
+from app.ingest.ingester import ingest_documents
+from app.db.mongo import ensure_indexes
 
 import requests
 from requests.adapters import HTTPAdapter
@@ -98,8 +96,8 @@ JSONL_FILE = os.path.join(OUTPUT_DIR, "results.jsonl")
 MAX_ATTEMPTS = int(os.getenv("SEED_MAX_ATTEMPTS", "4"))
 INITIAL_BACKOFF = float(os.getenv("SEED_BACKOFF_INITIAL", "1.0"))
 TIMEOUT = int(os.getenv("SEED_REQ_TIMEOUT", "20"))
-MIN_SLEEP = float(os.getenv("SEED_MIN_SLEEP", "0.8"))
-MAX_SLEEP = float(os.getenv("SEED_MAX_SLEEP", "1.6"))
+# fetched pages per bulk ingest call
+SEED_INGEST_BATCH = int(os.getenv("SEED_INGEST_BATCH", "10"))
 
 PROXY = os.getenv("SEED_PROXY", None)
 PROXIES = {"http": PROXY, "https": PROXY} if PROXY else None
@@ -193,21 +191,54 @@ def robust_fetch(url):
     write_failure(url, last_err)
     return None
 
-def seed_and_ingest(urls=SEED_URLS, max_pages=None):
+def flush_pages(pages):
+    """Ingest fetched pages in one bulk call (one embed pass, insert_many, no FAISS writes)."""
+    if not pages:
+        return 0
+    try:
+        result = ingest_documents(pages, chunk_size=1200, overlap=300, add_to_index=False)
+    except Exception as e:
+        print("Bulk ingest failed ->", e)
+        traceback.print_exc()
+        for page in pages:
+            write_failure(page["url"], f"ingest failed: {e}")
+        return 0
+    for page in pages:
+        url = page["url"]
+        inserted, total = len(result["new_ids"][url]), len(result["doc_ids"][url])
+        append_jsonl({"url": url, "inserted_chunks": inserted, "time": datetime.datetime.utcnow().isoformat()})
+        print(f"Inserted {inserted} chunks from {url} ({total - inserted} already stored)")
+    return result["inserted"]
+
+def seed_and_ingest(urls=SEED_URLS, max_pages=None, batch_pages=SEED_INGEST_BATCH):
+    ensure_indexes()
+    urls = list(urls)[:max_pages] if max_pages else list(urls)
+    allowed = []
+    for url in urls:
+        if is_allowed(url):
+            allowed.append(url)
+        else:
+            print(f"Skipping (not allowed domain): {url}")
+
+    # concurrent fetch (per-host cap + politeness delay); unchanged pages come back as 304s from the cache
+    print(f"Fetching {len(allowed)} pages...")
+    results = fetch_urls(allowed, headers=HEADERS)
+
     inserted_total = 0
-    for i, url in enumerate(urls):
-        if max_pages and i >= max_pages:
-            break
+    pages = []
+    for result in results:
+        url = result.url
         try:
-            if not is_allowed(url):
-                print(f"Skipping (not allowed domain): {url}")
-                continue
-
-            print(f"Fetching: {url}")
-            html = robust_fetch(url)
+            html = result.text
+            if html is None:
+                # slow path: serial retries + www/non-www variants
+                print(f"Fetch failed ({result.error}), retrying with fallbacks: {url}")
+                html = robust_fetch(url)
             if not html:
                 print(f"Fetch failed or returned empty for {url}")
                 continue
+            if result.not_modified:
+                print(f"Not modified since last seed: {url}")
 
             text = extract_text_from_html(html)
             if not text or len(text.strip()) < 200:
@@ -215,54 +246,22 @@ def seed_and_ingest(urls=SEED_URLS, max_pages=None):
                 write_failure(url, "extracted text too short or empty")
                 continue
 
-            chunks = basic_chunk_text(text, max_chars=1200, overlap=300)
-            if not chunks:
-                print("No chunks created, skipping.")
-                write_failure(url, "no chunks created")
-                continue
-
-            # embeddings
-            embs, normed = embed_texts(chunks)
-
-            # guard: ensure embedding length matches chunks
-            if len(embs) != len(chunks) or len(normed) != len(chunks):
-                # optional: attempt re-embedding single chunks or skip
-                print(f"Embedding length mismatch for {url}: chunks={len(chunks)} embs={len(embs)}")
-                write_failure(url, f"embed length mismatch: chunks={len(chunks)} embs={len(embs)}")
-                continue
-
-            for idx, chunk in enumerate(chunks):
-                doc = {
-                    "source": "seed",
-                    "url": url,
-                    "title": (url.split("/")[-1] or url),
-                    "text": chunk,
-                    "lang": "en",
-                    "tags": [],
-                    "created_at": datetime.datetime.utcnow(),
-                    "ingested_from_url": url
-                }
-                res = db.knowledge_documents.insert_one(doc)
-                doc_id_str = str(res.inserted_id)
-                emb_doc = {
-                    "doc_id": doc_id_str,
-                    "embedding": embs[idx].astype("float32").tolist(),
-                    "normed_embedding": normed[idx].astype("float32").tolist(),
-                    "vector_model": settings.EMBEDDING_MODEL,
-                    "created_at": datetime.datetime.utcnow()
-                }
-                db.embeddings.insert_one(emb_doc)
-                inserted_total += 1
-
-            record = {"url": url, "inserted_chunks": len(chunks), "time": datetime.datetime.utcnow().isoformat()}
-            append_jsonl(record)
-
-            print(f"Inserted {len(chunks)} chunks from {url}")
-            time.sleep(random.uniform(MIN_SLEEP, MAX_SLEEP))
+            # chunks are deduped by content hash at ingest; unchanged pages embed nothing
+            pages.append({
+                "url": url,
+                "title": (url.split("/")[-1] or url),
+                "raw_text": text,
+                "source": "seed",
+                "fields": {"lang": "en", "ingested_from_url": url},
+            })
+            if len(pages) >= batch_pages:
+                inserted_total += flush_pages(pages)
+                pages = []
         except Exception as e:
             print("Error on URL:", url, "->", e)
             traceback.print_exc()
             write_failure(url, str(e))
+    inserted_total += flush_pages(pages)
     print("SEED COMPLETE. Total inserted chunk docs:", inserted_total)
     return inserted_total
 
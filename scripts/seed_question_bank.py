@@ -7,7 +7,8 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backen
 sys.path.insert(0, BASE_DIR)
 
 try:
-    from app.db.mongo import db
+    from app.db.mongo import db, ensure_indexes
+    ensure_indexes()
     print("Connected to DB.")
 except ImportError:
     print("Error: Could not import db. Ensure app.db.mongo is accessible.")
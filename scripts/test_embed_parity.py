@@ -0,0 +1,78 @@
+# scripts/test_embed_parity.py
+"""
+Check that the ONNX embedding backends agree with the torch SentenceTransformer output.
+
+Usage:
+    python scripts/test_embed_parity.py [onnx] [onnx_int8]
+
+For each backend, prints per-sentence cosine vs torch, top-5 neighbour agreement and
+encode latency. Exits non-zero when a backend's minimum cosine is below its threshold.
+"""
+import sys, os, time
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend"))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+from app.embeddings.embedder import load_model, _encode
+from app.core.config import settings
+
+# minimum cosine similarity to the torch embedding, per backend
+THRESHOLDS = {"onnx": 0.9999, "onnx_int8": 0.98}
+
+SENTENCES = [
+    "Binary search finds an element in a sorted array in O(log n) time.",
+    "Breadth-first search explores a graph level by level using a queue.",
+    "Depth-first search uses a stack or recursion to explore as far as possible.",
+    "A stack is a LIFO data structure with push and pop operations.",
+    "A queue is a FIFO data structure.",
+    "Merge sort divides the array in halves and merges the sorted halves.",
+    "Quick sort picks a pivot and partitions the array around it.",
+    "Dynamic programming stores the results of overlapping subproblems.",
+    "A hash table maps keys to values using a hash function.",
+    "Dijkstra's algorithm finds shortest paths with non-negative edge weights.",
+    "what is the time complexity of heap sort",
+    "explain recursion with an example",
+    "how do I reverse a linked list",
+    "difference between BFS and DFS",
+    "two pointer technique",
+    "",
+]
+
+def timed_encode(model, texts):
+    _encode(texts[:2], model=model)  # warm up
+    started = time.perf_counter()
+    embs, normed = _encode(texts, model=model)
+    return embs, normed, (time.perf_counter() - started) * 1000 / len(texts)
+
+def top5(normed):
+    sims = normed @ normed.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :5]
+
+def main(backends):
+    print("model:", settings.EMBEDDING_MODEL)
+    torch_embs, torch_normed, torch_ms = timed_encode(load_model("torch"), SENTENCES)
+    print(f"torch: {torch_ms:.2f} ms/sentence, dim={torch_embs.shape[1]}")
+    ok = True
+    for backend in backends:
+        embs, normed, ms = timed_encode(load_model(backend), SENTENCES)
+        assert embs.shape == torch_embs.shape, f"{backend}: shape {embs.shape} != {torch_embs.shape}"
+        cos = np.sum(normed * torch_normed, axis=1)
+        norm_err = np.abs(np.linalg.norm(embs, axis=1) - np.linalg.norm(torch_embs, axis=1))
+        agree = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(top5(normed), top5(torch_normed))])
+        passed = cos.min() >= THRESHOLDS[backend]
+        ok = ok and passed
+        print(f"\n{backend}: {ms:.2f} ms/sentence ({torch_ms / ms:.1f}x torch)")
+        print(f"  cosine vs torch: min={cos.min():.5f} mean={cos.mean():.5f} (threshold {THRESHOLDS[backend]})")
+        print(f"  max |norm diff|: {norm_err.max():.5f}   top-5 neighbour agreement: {agree:.3f}")
+        for text, c in sorted(zip(SENTENCES, cos), key=lambda x: x[1])[:3]:
+            print(f"    {c:.5f}  {text[:60]!r}")
+        print("  PASS" if passed else "  FAIL")
+    return ok
+
+if __name__ == "__main__":
+    backends = sys.argv[1:] or ["onnx", "onnx_int8"]
+    for b in backends:
+        if b not in THRESHOLDS:
+            sys.exit(f"unknown backend {b!r}; choose from {', '.join(THRESHOLDS)}")
+    sys.exit(0 if main(backends) else 1)
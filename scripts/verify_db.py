@@ -3,6 +3,7 @@ import sys, os
 BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../backend"))
 sys.path.insert(0, BACKEND_DIR)
 from app.db.mongo import db
+from app.embeddings.vector_codec import decode_vector
 from bson import ObjectId
 import json
 import pprint
@@ -24,10 +25,14 @@ def print_sample(n=3):
     for e in db.embeddings.find({}).limit(n):
         print("id:", str(e["_id"]))
         print("doc_id:", e.get("doc_id"))
-        emb = e.get("embedding")
-        print("embedding len:", len(emb) if emb else None)
-        norm = e.get("normed_embedding")
-        print("normed len:", len(norm) if norm else None)
+        if e.get("vec") is not None:
+            vec = decode_vector(e)
+            print(f"packed {e.get('vec_dtype', 'f4')} vector len:", len(vec), "norm:", e.get("norm"))
+        else:
+            emb = e.get("embedding")
+            print("embedding len:", len(emb) if emb else None)
+            norm = e.get("normed_embedding")
+            print("normed len:", len(norm) if norm else None)
         print("-"*40)
 
 if __name__ == "__main__":